@@ -1,5 +1,7 @@
+import asyncio
 import os
 import discord
+from discord import app_commands
 from discord.ext import commands
 from logger import get_logger
 from dotenv import load_dotenv
@@ -15,27 +17,139 @@ intents.members = True
 
 APP_ID = os.getenv("DISCORD_APP_ID")
 
-bot = commands.Bot(command_prefix="!", intents=intents, application_id=APP_ID)
+# Sharding: SHARD_COUNT + SHARD_IDS (comma separated) pin this process to a subset of
+# shards (set by launcher.py); AUTO_SHARD=1 alone lets Discord pick the shard count.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT") or 0) or None
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()] or None
+
+
+def create_bot():
+    if SHARD_IDS and not SHARD_COUNT:
+        # every process must agree on the total, so it can't be looked up per process
+        raise SystemExit(
+            "SHARD_IDS needs SHARD_COUNT (the total number of shards across all processes)."
+        )
+    if SHARD_COUNT or SHARD_IDS or os.getenv("AUTO_SHARD") == "1":
+        return commands.AutoShardedBot(
+            command_prefix="!",
+            intents=intents,
+            application_id=APP_ID,
+            shard_count=SHARD_COUNT,
+            shard_ids=SHARD_IDS,
+        )
+    return commands.Bot(command_prefix="!", intents=intents, application_id=APP_ID)
+
+
+bot = create_bot()
+
+
+async def setup_hook():
+    # log the stack of anything that blocks the event loop
+    from utils.watchdog import LoopWatchdog, WATCHDOG_THRESHOLD
+
+    if WATCHDOG_THRESHOLD > 0:
+        bot.watchdog = LoopWatchdog(asyncio.get_running_loop())
+        bot.watchdog.start()
+
+    # SIGTERM/SIGINT drain in-flight work before closing (see utils/drain.py)
+    from utils.drain import drainer
+
+    drainer.install(bot, asyncio.get_running_loop())
+
+    # trace spans for Discord REST calls (TRACE_FILE enables tracing)
+    from utils.tracing import instrument_discord
+
+    instrument_discord(bot)
+
+    # invalidate caches when another instance changes settings, users or flips
+    from db.notify import start_listener
+
+    try:
+        bot.change_listener = start_listener(asyncio.get_running_loop())
+    except Exception as e:
+        logger.exception("Failed to start change listener: %s", e)
+
+    # optional local health/readiness endpoint for the process supervisor
+    if os.getenv("HEALTH_PORT"):
+        from utils.health import HealthServer
+
+        try:
+            bot.health = HealthServer(bot)
+            await bot.health.start()
+        except Exception as e:
+            logger.exception("Failed to start health endpoint: %s", e)
+
+
+bot.setup_hook = setup_hook
+
+
+async def interaction_check(interaction: discord.Interaction) -> bool:
+    # turns interactions away while draining and tracks the ones it lets through
+    from utils.drain import drainer
+
+    return await drainer.admit(interaction)
+
+
+bot.tree.interaction_check = interaction_check
 
 
 @bot.event
 async def on_ready():
-    logger.info(f"Logged in as {bot.user} (id: {bot.user.id})")
+    from utils.cache import set_shard_count
+
+    set_shard_count(bot.shard_count or 1)
+    logger.info(
+        f"Logged in as {bot.user} (id: {bot.user.id}), shards {SHARD_IDS or 'all'} of {bot.shard_count or 1}"
+    )
     # load cogs
     try:
         await bot.load_extension("cogs.flip")
         await bot.load_extension("cogs.admin")
+        await bot.load_extension("cogs.maintenance")
         logger.info("Cogs loaded.")
     except Exception as e:
         logger.exception("Failed to load cogs: %s", e)
-    # sync global commands (be careful in prod, may use guild sync for dev)
+    # sync global commands, plus instant copies in SYNC_GUILD_IDS test guilds
+    # with several shard processes only the one holding shard 0 syncs
+    if SHARD_IDS and 0 not in SHARD_IDS:
+        return
+    from utils.command_sync import sync_commands, SYNC_GUILD_IDS
+
+    # only changed commands are pushed; an unchanged tree costs one request
     try:
-        await bot.tree.sync()
-        logger.info("Command tree synced.")
+        result = await sync_commands(bot)
+        logger.info("Command tree synced: %s", result)
+        for guild_id in SYNC_GUILD_IDS:
+            result = await sync_commands(bot, guild=discord.Object(id=guild_id))
+            logger.info("Commands copied to test guild %s: %s", guild_id, result)
     except Exception as e:
         logger.warning("Could not sync command tree: %s", e)
 
 
+@bot.event
+async def on_shard_ready(shard_id: int):
+    # a fresh gateway session may have missed updates; drop that shard's cached guilds
+    from utils.cache import clear_shard
+
+    clear_shard(shard_id)
+    logger.info("Shard %s ready", shard_id)
+
+
+@bot.tree.error
+async def on_app_command_error(
+    interaction: discord.Interaction, error: app_commands.AppCommandError
+):
+    from db.resilience import DatabaseUnavailable
+    from utils.helpers import reply_db_unavailable
+
+    original = getattr(error, "original", error)
+    if isinstance(original, DatabaseUnavailable):
+        logger.warning("Command failed, database unavailable: %s", original)
+        await reply_db_unavailable(interaction)
+        return
+    logger.error("Unhandled app command error: %s", error, exc_info=error)
+
+
 if __name__ == "__main__":
     token = os.getenv("DISCORD_TOKEN")
     if not token:
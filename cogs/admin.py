@@ -1,164 +1,156 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
 import discord
 from discord.ext import commands
 from discord import app_commands
 from db.supabase import (
     get_pending_flips,
-    update_flip,
-    add_user_profit,
     get_leaderboard_top,
     ensure_guild_settings,
-    supabase,
+    upsert_guild_settings,
+    defer_guild_settings,
+    iter_flips,
+    ping,
+    db_health,
 )
+from db.resilience import DatabaseUnavailable
 from logger import get_logger
-from utils.helpers import build_flip_embed, build_leaderboard_embed
+from utils.helpers import (
+    build_flip_embed,
+    build_leaderboard_pages,
+    reply_db_unavailable,
+)
+from utils.cache import leaderboard_cache, leaderboard_render_cache
+from utils.export import export_to_tempfile
+from utils.profiler import profile_session, PROFILE_MAX_SECONDS
+from utils.command_sync import sync_commands, clear_guild_commands
+from utils.drain import drainer
+from db import reconcile
 from datetime import datetime
 
 logger = get_logger("admin")
 
 
-class ApproveView(discord.ui.View):
-    def __init__(self, flip_row, cog):
+def _current_page(message) -> int:
+    """Zero-based page shown on a summary message, read back from its footer."""
+    try:
+        footer = message.embeds[0].footer.text or ""
+        return int(footer.split("Page ", 1)[1].split("/", 1)[0]) - 1
+    except (IndexError, ValueError, AttributeError):
+        return 0
+
+
+class LeaderboardPager(discord.ui.View):
+    """
+    Previous/next buttons on the leaderboard summary. Stateless: the page shown
+    is read from the message footer, so one registered instance serves every guild.
+    """
+
+    def __init__(self, cog):
         super().__init__(timeout=None)
-        self.flip = flip_row
         self.cog = cog
 
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await drainer.admit(interaction)
+
+    async def _turn(self, interaction: discord.Interaction, step: int):
+        try:
+            pages, _ = await self.cog.leaderboard_pages(interaction.guild)
+            page = (_current_page(interaction.message) + step) % len(pages)
+            await interaction.response.edit_message(
+                embed=pages[page], view=self.cog.pager_for(pages)
+            )
+        except DatabaseUnavailable:
+            await reply_db_unavailable(interaction)
+        except Exception as e:
+            logger.exception("Failed to turn leaderboard page: %s", e)
+
     @discord.ui.button(
-        label="Approve", style=discord.ButtonStyle.success, custom_id="approve_flip"
+        label="◀", style=discord.ButtonStyle.secondary, custom_id="leaderboard:prev"
     )
-    async def approve(
+    async def previous(
         self, interaction: discord.Interaction, button: discord.ui.Button
     ):
-        await interaction.response.defer()
-        try:
-            update_flip(
-                self.flip["id"],
-                {
-                    "status": "approved",
-                    "handled_by": interaction.user.id,
-                    "handled_at": "now()",
-                },
-            )
-
-            user_obj = interaction.guild.get_member(self.flip["user_id"])
-            username = user_obj.name if user_obj else str(self.flip["user_id"])
-
-            add_user_profit(
-                interaction.guild.id,
-                self.flip["user_id"],
-                username,
-                float(self.flip.get("profit") or 0.0),
-            )
-
-            # send (or edit) the leaderboard summary (this reads from users table)
-            try:
-                await self.cog.send_leaderboard_summary(interaction.guild)
-            except Exception:
-                logger.exception("Failed to send leaderboard summary after approval")
-
-            await interaction.message.edit(content="Flip approved ✅", view=None)
-            await interaction.followup.send("Flip approved and posted.", ephemeral=True)
-        except Exception as e:
-            logger.exception("Error approving flip: %s", e)
-            try:
-                await interaction.message.edit(
-                    content="Failed to approve (see logs).", view=None
-                )
-            except Exception:
-                pass
-            await interaction.followup.send(
-                "Failed to approve flip. Check logs.", ephemeral=True
-            )
+        await self._turn(interaction, -1)
 
     @discord.ui.button(
-        label="Deny", style=discord.ButtonStyle.danger, custom_id="deny_flip"
+        label="▶", style=discord.ButtonStyle.secondary, custom_id="leaderboard:next"
     )
-    async def deny(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer()
-        try:
-            update_flip(
-                self.flip["id"],
-                {
-                    "status": "denied",
-                    "handled_by": interaction.user.id,
-                    "handled_at": "now()",
-                },
-            )
-            await interaction.message.edit(content="Flip denied ❌", view=None)
-            await interaction.followup.send("Flip denied.", ephemeral=True)
-        except Exception as e:
-            logger.exception("Error denying flip: %s", e)
-            try:
-                await interaction.message.edit(
-                    content="Failed to deny (see logs).", view=None
-                )
-            except Exception:
-                pass
-            await interaction.followup.send(
-                "Failed to deny flip. Check logs.", ephemeral=True
-            )
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, 1)
 
 
 class AdminCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # guild id -> (summary message id, digest of what it shows)
+        self._posted = {}
+        self.summary_edits_skipped = 0
+
+    async def cog_load(self):
+        self.bot.add_view(LeaderboardPager(self))
+
+    async def leaderboard_pages(self, guild: discord.Guild):
+        """
+        Rendered summary pages for a guild and a digest of their content. Pages are
+        memoized against the cached leaderboard rows they were built from, so they
+        are re-rendered whenever those rows are replaced, invalidated or expire.
+        """
+        version = leaderboard_cache.version(guild.id)
+        cached = leaderboard_render_cache.get(guild.id)
+        if cached and version is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+        # read authoritative users table via get_leaderboard_top
+        rows = await asyncio.to_thread(get_leaderboard_top, guild.id, 1000) or []
+        total = 0.0
+        for r in rows:
+            try:
+                total += float(r.get("total_profit") or 0.0)
+            except Exception:
+                logger.debug("Skipping unparsable total_profit for row: %s", r)
+
+        pages = build_leaderboard_pages(
+            rows,
+            title="🏆 Leaderboard Summary",
+            description="Totals and participants",
+            total=total,
+        )
+        digest = hashlib.sha1(
+            json.dumps([e.to_dict() for e in pages], sort_keys=True).encode()
+        ).hexdigest()
+        # the rows just read are the live entry now; a failed read returns []
+        # without caching it, and that mustn't be memoized
+        version = leaderboard_cache.version(guild.id)
+        if version is not None:
+            leaderboard_render_cache.set(guild.id, (version, pages, digest))
+        return pages, digest
+
+    def pager_for(self, pages):
+        if len(pages) < 2:
+            return None
+        view = LeaderboardPager(self)
+        # the registered persistent pager handles clicks; don't keep a copy per message
+        view.stop()
+        return view
 
     async def send_leaderboard_summary(self, guild: discord.Guild):
         """
         Send or update a single 'Leaderboard Summary' message in the leaderboard channel.
         Robust to the following:
-        - stored summary message deleted (fetch -> 404) => send a new message
+        - stored summary message deleted (edit -> 404) => send a new message
         - missing DB column for leaderboard_summary_message_id (we assume it's present after SQL)
         - uses authoritative users table via get_leaderboard_top
+        The edit is skipped when the rendered summary is identical to what was last posted.
         """
         try:
-            # 1) read authoritative users table via get_leaderboard_top
-            rows = get_leaderboard_top(guild.id, limit=1000) or []
-
-            # 2) compute total profit
-            total = 0.0
-            for r in rows:
-                try:
-                    total += float(r.get("total_profit") or 0.0)
-                except Exception:
-                    logger.debug("Skipping unparsable total_profit for row: %s", r)
+            pages, digest = await self.leaderboard_pages(guild)
 
-            # 3) build embed
-            embed = discord.Embed(
-                title="🏆 Leaderboard Summary", description="Totals and participants"
-            )
-            try:
-                embed.add_field(
-                    name="Total profit", value=f"${total:,.2f}", inline=False
-                )
-            except Exception:
-                embed.add_field(name="Total profit", value=str(total), inline=False)
-
-            if rows:
-                lines = []
-                medals = ["🥇", "🥈", "🥉"]
-                for i, r in enumerate(rows, start=1):
-                    uid = r.get("id")
-                    mention = f"<@{uid}>" if uid else "Unknown"
-                    try:
-                        profit = float(r.get("total_profit") or 0)
-                    except Exception:
-                        profit = 0.0
-                    profit_str = f"${profit:,.2f}"
-                    rank_icon = medals[i - 1] if i <= 3 else f"#{i}"
-                    lines.append(f"{rank_icon} {mention} — {profit_str}")
-                participants_text = "\n".join(lines)
-
-            else:
-                participants_text = "No participants yet."
-
-            # Trim to 1024 char field limit
-            if len(participants_text) > 1024:
-                participants_text = participants_text[:1000] + "\n…"
-
-            embed.add_field(name="Participants", value=participants_text, inline=False)
-
-            # 4) find leaderboard channel & existing summary message id
-            settings = ensure_guild_settings(guild.id)
+            # find leaderboard channel & existing summary message id
+            settings = await asyncio.to_thread(ensure_guild_settings, guild.id)
             lb_chan_id = settings.get("leaderboard_channel_id")
             summary_msg_id = settings.get("leaderboard_summary_message_id")
             lb_channel = (
@@ -173,47 +165,48 @@ class AdminCog(commands.Cog):
                 )
                 return
 
-            # 5) Try to edit existing summary message; if not found (404) send a new one
+            if summary_msg_id and self._posted.get(guild.id) == (summary_msg_id, digest):
+                self.summary_edits_skipped += 1
+                logger.debug("Leaderboard summary unchanged for guild %s", guild.id)
+                return
+
+            # Try to edit existing summary message; if not found (404) send a new one
             sent_msg = None
             if summary_msg_id:
                 try:
-                    msg = await lb_channel.fetch_message(summary_msg_id)
-                    await msg.edit(embed=embed)
-                    sent_msg = msg
+                    sent_msg = await lb_channel.get_partial_message(
+                        summary_msg_id
+                    ).edit(embed=pages[0], view=self.pager_for(pages))
                 except discord.NotFound:
                     logger.warning(
                         "Stored leaderboard summary message was not found (deleted). Will send a new one."
                     )
                 except Exception as e:
                     logger.exception(
-                        "Could not fetch/edit leaderboard summary message: %s", e
+                        "Could not edit leaderboard summary message: %s", e
                     )
 
             # If we didn't successfully edit an existing message, send a new one
             if not sent_msg:
                 try:
-                    sent_msg = await lb_channel.send(embed=embed)
+                    sent_msg = await lb_channel.send(
+                        embed=pages[0], view=self.pager_for(pages)
+                    )
                 except Exception as e:
                     logger.exception(
                         "Failed to send leaderboard summary message: %s", e
                     )
                     return
 
-                # Upsert the new summary message id into guild_settings
-                try:
-                    supabase.table("guild_settings").upsert(
-                        {
-                            "guild_id": guild.id,
-                            "leaderboard_summary_message_id": sent_msg.id,
-                            "leaderboard_channel_id": lb_channel.id,
-                        }
-                    ).execute()
-                except Exception as e:
-                    # This should now work if you ran the SQL above; if it still fails, log with details.
-                    logger.exception(
-                        "Failed to upsert leaderboard_summary_message_id into guild_settings: %s",
-                        e,
-                    )
+                # Record the new summary message id; the cached settings see it
+                # immediately and the row follows on the next write-behind flush
+                defer_guild_settings(
+                    guild.id,
+                    leaderboard_summary_message_id=sent_msg.id,
+                    leaderboard_channel_id=lb_channel.id,
+                )
+
+            self._posted[guild.id] = (sent_msg.id, digest)
 
         except Exception as e:
             logger.exception("Failed to build/send leaderboard summary: %s", e)
@@ -232,7 +225,10 @@ class AdminCog(commands.Cog):
             return
 
         try:
-            settings = ensure_guild_settings(interaction.guild.id) or {}
+            settings = (
+                await asyncio.to_thread(ensure_guild_settings, interaction.guild.id)
+                or {}
+            )
 
             # Channel IDs we store in guild_settings
             member_flips_chan_id = settings.get("member_flips_channel_id")
@@ -286,6 +282,8 @@ class AdminCog(commands.Cog):
 
             await interaction.followup.send(embed=embed, ephemeral=True)
 
+        except DatabaseUnavailable:
+            await reply_db_unavailable(interaction)
         except Exception as e:
             logger.exception("Failed to show config: %s", e)
             await interaction.followup.send(
@@ -314,14 +312,15 @@ class AdminCog(commands.Cog):
             )
             return
         try:
-            supabase.table("guild_settings").upsert(
-                {
-                    "guild_id": interaction.guild.id,
-                    "member_flips_channel_id": member_flips_channel.id,
-                    "leaderboard_channel_id": leaderboard_channel.id,
-                }
-            ).execute()
+            await asyncio.to_thread(
+                upsert_guild_settings,
+                interaction.guild.id,
+                member_flips_channel_id=member_flips_channel.id,
+                leaderboard_channel_id=leaderboard_channel.id,
+            )
             await interaction.followup.send("✅ Channels configured.", ephemeral=True)
+        except DatabaseUnavailable:
+            await reply_db_unavailable(interaction)
         except Exception as e:
             logger.exception("Failed to set channels: %s", e)
             await interaction.followup.send(
@@ -346,48 +345,282 @@ class AdminCog(commands.Cog):
             )
             return
         try:
-            supabase.table("guild_settings").upsert(
-                {"guild_id": interaction.guild.id, "log_channel_id": log_channel.id}
-            ).execute()
+            await asyncio.to_thread(
+                upsert_guild_settings,
+                interaction.guild.id,
+                log_channel_id=log_channel.id,
+            )
             await interaction.followup.send(
                 "✅ Log channel configured.", ephemeral=True
             )
+        except DatabaseUnavailable:
+            await reply_db_unavailable(interaction)
         except Exception as e:
             logger.exception("Failed to set log channel: %s", e)
             await interaction.followup.send(
                 "❌ Failed to configure log channel. Check logs.", ephemeral=True
             )
 
+    @app_commands.command(
+        name="exportflips",
+        description="Export this server's flips as a compressed CSV or Parquet file.",
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(
+        status="Only export flips with this status",
+        since="Only flips submitted on/after this date (YYYY-MM-DD)",
+        until="Only flips submitted before this date (YYYY-MM-DD)",
+        file_format="Output format (default: csv)",
+    )
+    @app_commands.choices(
+        status=[
+            app_commands.Choice(name="Pending", value="pending"),
+            app_commands.Choice(name="Approved", value="approved"),
+            app_commands.Choice(name="Denied", value="denied"),
+        ],
+        file_format=[
+            app_commands.Choice(name="CSV (gzip)", value="csv"),
+            app_commands.Choice(name="Parquet", value="parquet"),
+        ],
+    )
+    async def exportflips(
+        self,
+        interaction: discord.Interaction,
+        status: app_commands.Choice[str] = None,
+        since: str = None,
+        until: str = None,
+        file_format: app_commands.Choice[str] = None,
+    ):
+        await interaction.response.defer(ephemeral=True)
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.followup.send(
+                "You need Manage Server permission to use this.", ephemeral=True
+            )
+            return
+
+        try:
+            for value in (since, until):
+                if value:
+                    datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            await interaction.followup.send(
+                "❌ Dates must be in `YYYY-MM-DD` format.", ephemeral=True
+            )
+            return
+
+        fmt = file_format.value if file_format else "csv"
+        rows = iter_flips(
+            interaction.guild.id,
+            status=status.value if status else None,
+            since=since,
+            until=until,
+        )
+
+        path = None
+        try:
+            # paging through the DB and writing the file both block, keep them off the loop
+            path, count = await asyncio.to_thread(export_to_tempfile, rows, fmt)
+
+            size = os.path.getsize(path)
+            if size > interaction.guild.filesize_limit:
+                await interaction.followup.send(
+                    f"❌ Export is {size / (1024 * 1024):.1f} MB, over this server's upload limit. "
+                    "Narrow it down with `status`, `since` or `until`.",
+                    ephemeral=True,
+                )
+                return
+
+            filename = f"flips-{interaction.guild.id}" + (
+                ".parquet" if fmt == "parquet" else ".csv.gz"
+            )
+            await interaction.followup.send(
+                f"✅ Exported {count} flips.",
+                file=discord.File(path, filename=filename),
+                ephemeral=True,
+            )
+            logger.info(
+                "Exported %s flips for guild %s (%s)", count, interaction.guild.id, fmt
+            )
+        except DatabaseUnavailable:
+            await reply_db_unavailable(interaction)
+        except Exception as e:
+            logger.exception("Failed to export flips: %s", e)
+            await interaction.followup.send(
+                "❌ Export failed. Check logs.", ephemeral=True
+            )
+        finally:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    @app_commands.command(
+        name="rebuildprofits",
+        description="Recompute every member's total profit from approved flips.",
+    )
+    @app_commands.default_permissions(administrator=True)
+    async def rebuildprofits(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.followup.send(
+                "You need Manage Server permission to use this.", ephemeral=True
+            )
+            return
+        try:
+            patched = await asyncio.to_thread(
+                reconcile.rebuild_guild, interaction.guild.id
+            )
+            if patched:
+                await self.send_leaderboard_summary(interaction.guild)
+            message = f"✅ Totals rebuilt — {patched} member total(s) corrected."
+            if not reconcile.DATABASE_URL:
+                message += (
+                    "\nℹ️ Without a direct database connection this is best-effort; "
+                    "members with very recent approvals were skipped."
+                )
+            await interaction.followup.send(message, ephemeral=True)
+            logger.info(
+                "Rebuilt profits for guild %s (%s corrected)",
+                interaction.guild.id,
+                patched,
+            )
+        except DatabaseUnavailable:
+            await reply_db_unavailable(interaction)
+        except Exception as e:
+            logger.exception("Failed to rebuild profits: %s", e)
+            await interaction.followup.send(
+                "❌ Failed to rebuild totals. Check logs.", ephemeral=True
+            )
+
+    @app_commands.command(
+        name="profile",
+        description="Profile the running bot for a few seconds (bot owner only).",
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(
+        seconds="How long to profile",
+        mode="Sampling only (low overhead) or also cProfile the event loop",
+    )
+    @app_commands.choices(
+        mode=[
+            app_commands.Choice(name="Sampling", value="sample"),
+            app_commands.Choice(name="Sampling + cProfile", value="cprofile"),
+        ]
+    )
+    async def profile(
+        self,
+        interaction: discord.Interaction,
+        seconds: app_commands.Range[int, 1, PROFILE_MAX_SECONDS],
+        mode: app_commands.Choice[str] = None,
+    ):
+        await interaction.response.defer(ephemeral=True)
+        # the profile covers every guild this process serves, not just this one
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.followup.send(
+                "Only the bot owner can use this.", ephemeral=True
+            )
+            return
+        try:
+            report, collapsed = await profile_session(
+                seconds, use_cprofile=bool(mode and mode.value == "cprofile")
+            )
+        except RuntimeError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        except Exception as e:
+            logger.exception("Profiling failed: %s", e)
+            await interaction.followup.send(
+                "❌ Profiling failed. Check logs.", ephemeral=True
+            )
+            return
+
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        await interaction.followup.send(
+            f"✅ Profiled for {seconds}s. `profile-{stamp}.collapsed` can be loaded "
+            "into speedscope or flamegraph.pl.",
+            files=[
+                discord.File(io.BytesIO(report.encode()), filename=f"profile-{stamp}.txt"),
+                discord.File(
+                    io.BytesIO(collapsed.encode()), filename=f"profile-{stamp}.collapsed"
+                ),
+            ],
+            ephemeral=True,
+        )
+        logger.info("Profile of %ss taken by %s", seconds, interaction.user.id)
+
     @app_commands.command(name="pingdb", description="Check Supabase connectivity")
     @app_commands.default_permissions(administrator=True)
     async def pingdb(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        from db.supabase import ping
 
-        ok, msg = ping()
+        ok, msg = await asyncio.to_thread(ping)
+        health = db_health()
+        circuit = f"Circuit: `{health['state']}` (failures: {health['consecutive_failures']}"
+        if health["state"] == "open":
+            circuit += f", retry in {health['retry_in']}s"
+        circuit += ")"
+        if health["last_error"] and health["state"] != "closed":
+            circuit += f"\nLast error: `{health['last_error'][:200]}`"
         if ok:
             await interaction.followup.send(
-                "✅ Supabase connected: " + str(msg), ephemeral=True
+                "✅ Supabase connected: " + str(msg) + "\n" + circuit, ephemeral=True
             )
         else:
             await interaction.followup.send(
-                "❌ Supabase ping failed: " + str(msg), ephemeral=True
+                "❌ Supabase ping failed: " + str(msg) + "\n" + circuit,
+                ephemeral=True,
             )
 
     @app_commands.command(
         name="sync",
-        description="Sync bot's slash commands globally (admin only).",
+        description="Sync the bot's slash commands (admin only).",
     )
     @app_commands.default_permissions(administrator=True)
-    async def sync(self, interaction: discord.Interaction):
+    @app_commands.describe(
+        scope="Where to sync (default: global)",
+        guild_id="Target server for 'Server' / 'Clear server' (default: this one; others are owner only)",
+    )
+    @app_commands.choices(
+        scope=[
+            app_commands.Choice(name="Global", value="global"),
+            app_commands.Choice(name="Server (instant, copies global commands)", value="guild"),
+            app_commands.Choice(name="Clear server copies", value="clear"),
+        ]
+    )
+    async def sync(
+        self,
+        interaction: discord.Interaction,
+        scope: app_commands.Choice[str] = None,
+        guild_id: str = None,
+    ):
         await interaction.response.defer(ephemeral=True)
+        mode = scope.value if scope else "global"
         try:
-            synced = await self.bot.tree.sync()
+            target = None
+            if mode != "global":
+                target = discord.Object(id=int(guild_id)) if guild_id else interaction.guild
+            # the global tree and other servers aren't this server admin's to change
+            if (mode == "global" or target.id != interaction.guild.id) and not (
+                await self.bot.is_owner(interaction.user)
+            ):
+                await interaction.followup.send(
+                    "Only the bot owner can sync globally or for another server; "
+                    "use scope 'Server' or 'Clear server copies' here.",
+                    ephemeral=True,
+                )
+                return
+            if mode == "clear":
+                clear_guild_commands(self.bot, target)
+            result = await sync_commands(self.bot, guild=target, copy_global=mode == "guild")
+            where = f"server `{target.id}`" if target else "global scope"
             await interaction.followup.send(
-                f"✅ Synced {len(synced)} global commands successfully.",
+                f"✅ Synced {where}: {result['created']} created, {result['updated']} updated, "
+                f"{result['deleted']} deleted, {result['unchanged']} unchanged.",
                 ephemeral=True,
             )
-            logger.info("Globally synced %s commands", len(synced))
+            logger.info("Synced commands for %s: %s", where, result)
+        except ValueError:
+            await interaction.followup.send(
+                "❌ `guild_id` must be a server id.", ephemeral=True
+            )
         except Exception as e:
             logger.exception("Unexpected error during sync: %s", e)
             await interaction.followup.send(f"❌ Sync failed: {e}", ephemeral=True)
@@ -1,23 +1,72 @@
+import asyncio
+import os
+import uuid
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 from logger import get_logger
-from utils.helpers import build_flip_embed, send_log_message, clean_number
+from utils.helpers import (
+    build_flip_embed,
+    send_log_message,
+    reply_db_unavailable,
+    build_user_stats_embed,
+)
 from db.supabase import (
     ensure_guild_settings,
     insert_flip,
     update_flip,
     add_user_profit,
-    supabase,
+    find_latest_pending_flip,
+    get_flip_member_message_id,
+    get_flip_by_message_id,
+    get_leaderboard_top,
+    get_user_stats,
+    note_approved_flip,
+    count_users_above,
+    defer_flip_update,
+)
+from db.resilience import DatabaseUnavailable
+from db import outbox, writebehind
+from utils.health import register_queue
+from utils.drain import drainer
+from utils.pending import pending_approvals
+from utils.tracing import traced
+from utils.item_index import get_item_index, record_item
+from utils.screening import screen_for
+from utils.photos import (
+    store_photo,
+    validate_attachment,
+    PhotoRejected,
+    close_session,
+    thumbnails_available,
 )
+from utils.money import parse_money, cents_to_amount, MoneyError
 
 logger = get_logger("flip")
 
+OUTBOX_REPLAY_SECONDS = float(os.getenv("OUTBOX_REPLAY_SECONDS", "15"))
+# same row count the leaderboard summary reads, so both share one cached query
+LEADERBOARD_LIMIT = 1000
+AUTOCOMPLETE_BUILD_WAIT = 2.0
+PRICE_FIELDS = (
+    ("purchase_price", "Purchase price"),
+    ("parts_price", "Parts price"),
+    ("sales_price", "Sales price"),
+)
+
 
 class ApproveRejectView(discord.ui.View):
-    def __init__(self, flip_data: dict):
+    """
+    Approve/Reject buttons for submissions. A single persistent instance
+    (registered with bot.add_view) handles the buttons on every member-flips
+    message; per-submission state lives in `pending_approvals`, keyed by message id.
+    """
+
+    def __init__(self):
         super().__init__(timeout=None)
-        self.flip = flip_data
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await drainer.admit(interaction)
 
     async def _is_moderator(self, interaction: discord.Interaction) -> bool:
         return (
@@ -25,42 +74,60 @@ class ApproveRejectView(discord.ui.View):
             or interaction.user == interaction.guild.owner
         )
 
-    async def _ensure_flip_row(self, guild_id: int):
-        if self.flip.get("id"):
-            return self.flip.get("id")
+    async def _resolve_flip(self, interaction: discord.Interaction, entry):
+        """
+        The submission behind the clicked message: its claimed registry entry or,
+        if that was evicted or posted before a restart, its row while still pending.
+        """
+        if entry:
+            return entry.to_flip()
+        row = await asyncio.to_thread(
+            get_flip_by_message_id, interaction.guild.id, interaction.message.id
+        )
+        if not row or row.get("status") != "pending":
+            return None
+        row["member_message_id"] = interaction.message.id
+        return row
+
+    async def _claim(self, interaction: discord.Interaction):
+        """Claim the clicked submission; (False, None) if another click has it."""
+        claimed, entry = pending_approvals.claim(interaction.message.id)
+        if not claimed:
+            await interaction.followup.send(
+                "Another moderator is handling this submission right now.",
+                ephemeral=True,
+            )
+        return claimed, entry
+
+    async def _ensure_flip_row(self, flip: dict, guild_id: int):
+        if flip.get("id"):
+            return flip.get("id")
 
         # Fallback: attempt to find most recent pending flip by same submitter+item+profit
         try:
-            qry = (
-                supabase.table("flips")
-                .select("*")
-                .eq("guild_id", guild_id)
-                .eq("user_id", self.flip.get("user_id"))
-                .eq("item", self.flip.get("item"))
-                .eq("status", "pending")
-                .order("created_at", desc=True)
-                .limit(1)
+            row = await asyncio.to_thread(
+                find_latest_pending_flip,
+                guild_id,
+                flip.get("user_id"),
+                flip.get("item"),
             )
-            resp = qry.execute()
-            rows = None
-            try:
-                rows = resp.data
-            except Exception:
-                try:
-                    rows = resp.get("data")
-                except Exception:
-                    rows = None
-
-            if rows:
-                row = rows[0]
-                self.flip["id"] = row.get("id")
+            if row:
+                flip["id"] = row.get("id")
                 if row.get("member_message_id"):
-                    self.flip["member_message_id"] = row.get("member_message_id")
-                return self.flip["id"]
+                    flip["member_message_id"] = row.get("member_message_id")
+                return flip["id"]
+        except DatabaseUnavailable:
+            raise
         except Exception:
             logger.exception("Fallback query to locate pending flip failed.")
         return None
 
+    async def _still_queued(self, flip: dict) -> bool:
+        outbox_id = flip.get("outbox_id")
+        if not outbox_id:
+            return False
+        return await asyncio.to_thread(outbox.is_pending, outbox_id)
+
     async def _edit_submission_message(
         self,
         guild: discord.Guild,
@@ -69,7 +136,7 @@ class ApproveRejectView(discord.ui.View):
         approved: bool,
     ):
         try:
-            settings = ensure_guild_settings(guild.id)
+            settings = await asyncio.to_thread(ensure_guild_settings, guild.id)
             mf_chan_id = settings.get("member_flips_channel_id")
             member_channel = (
                 guild.get_channel(mf_chan_id)
@@ -99,7 +166,10 @@ class ApproveRejectView(discord.ui.View):
                 "Failed to edit original submission message in member_flips channel."
             )
 
-    @discord.ui.button(label="Approve", style=discord.ButtonStyle.success)
+    @discord.ui.button(
+        label="Approve", style=discord.ButtonStyle.success, custom_id="flip:approve"
+    )
+    @traced("flip.approve")
     async def approve(
         self, interaction: discord.Interaction, button: discord.ui.Button
     ):
@@ -109,12 +179,29 @@ class ApproveRejectView(discord.ui.View):
             )
         await interaction.response.defer(ephemeral=True)
 
+        claimed, entry = await self._claim(interaction)
+        if not claimed:
+            return
+        handled = False
         try:
-            flip_id = await self._ensure_flip_row(interaction.guild.id)
-            if not flip_id:
-                logger.error(
-                    "Attempted to approve flip but no DB id found: %s", self.flip
+            flip = await self._resolve_flip(interaction, entry)
+            if not flip:
+                await interaction.followup.send(
+                    "Could not find this submission — it may already have been handled.",
+                    ephemeral=True,
                 )
+                return
+            # a queued flip already has its id, but no row yet
+            if await self._still_queued(flip):
+                await interaction.followup.send(
+                    "⏳ This submission is still waiting to be saved to the database. "
+                    "Please try again in a minute.",
+                    ephemeral=True,
+                )
+                return
+            flip_id = await self._ensure_flip_row(flip, interaction.guild.id)
+            if not flip_id:
+                logger.error("Attempted to approve flip but no DB id found: %s", flip)
                 await interaction.followup.send(
                     "Failed to approve — could not locate the database row for this submission.",
                     ephemeral=True,
@@ -127,7 +214,8 @@ class ApproveRejectView(discord.ui.View):
                     pass
                 return
 
-            update_flip(
+            await asyncio.to_thread(
+                update_flip,
                 flip_id,
                 {
                     "status": "approved",
@@ -135,34 +223,28 @@ class ApproveRejectView(discord.ui.View):
                     "handled_at": "now()",
                 },
             )
+            # from here on the status is written; a retry must not approve again
+            handled = True
 
-            user_obj = interaction.guild.get_member(self.flip["user_id"])
-            username = user_obj.name if user_obj else str(self.flip["user_id"])
+            user_obj = interaction.guild.get_member(flip["user_id"])
+            username = user_obj.name if user_obj else str(flip["user_id"])
 
-            add_user_profit(
+            await asyncio.to_thread(
+                add_user_profit,
                 interaction.guild.id,
-                self.flip["user_id"],
+                flip["user_id"],
                 username,
-                float(self.flip.get("profit") or 0.0),
+                float(flip.get("profit") or 0.0),
             )
+            note_approved_flip(interaction.guild.id, flip["user_id"], flip)
+            record_item(interaction.guild.id, flip.get("item"))
 
-            member_message_id = self.flip.get("member_message_id")
+            member_message_id = flip.get("member_message_id")
             if not member_message_id:
                 try:
-                    resp = (
-                        supabase.table("flips")
-                        .select("member_message_id")
-                        .eq("id", flip_id)
-                        .single()
-                        .execute()
-                    )
-                    row = (
-                        getattr(resp, "data", None) or resp.get("data")
-                        if isinstance(resp, dict)
-                        else None
+                    member_message_id = await asyncio.to_thread(
+                        get_flip_member_message_id, flip_id
                     )
-                    if row:
-                        member_message_id = row.get("member_message_id")
                 except Exception:
                     logger.debug(
                         "Could not fetch member_message_id from DB for flip id %s",
@@ -173,13 +255,13 @@ class ApproveRejectView(discord.ui.View):
                 await self._edit_submission_message(
                     interaction.guild,
                     int(member_message_id),
-                    self.flip["user_id"],
+                    flip["user_id"],
                     True,
                 )
             else:
                 try:
                     await interaction.message.edit(
-                        content=f"<@{self.flip['user_id']}> — Approved ✅", view=None
+                        content=f"<@{flip['user_id']}> — Approved ✅", view=None
                     )
                 except Exception:
                     pass
@@ -193,11 +275,14 @@ class ApproveRejectView(discord.ui.View):
 
             await send_log_message(
                 interaction.guild,
-                f"✅ **Flip approved:** {self.flip.get('item')} (submitted by <@{self.flip['user_id']}>)",
+                f"✅ **Flip approved:** {flip.get('item')} (submitted by <@{flip['user_id']}>)",
             )
 
             # await interaction.followup.send("Flip approved and saved.", ephemeral=True)
 
+        except DatabaseUnavailable as e:
+            logger.warning("Could not approve flip, database unavailable: %s", e)
+            await reply_db_unavailable(interaction)
         except Exception as e:
             logger.exception("Error approving flip: %s", e)
             try:
@@ -209,8 +294,13 @@ class ApproveRejectView(discord.ui.View):
             await interaction.followup.send(
                 "Failed to approve flip. Check logs.", ephemeral=True
             )
+        finally:
+            pending_approvals.release(interaction.message.id, entry, handled)
 
-    @discord.ui.button(label="Reject", style=discord.ButtonStyle.danger)
+    @discord.ui.button(
+        label="Reject", style=discord.ButtonStyle.danger, custom_id="flip:reject"
+    )
+    @traced("flip.reject")
     async def reject(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not await self._is_moderator(interaction):
             return await interaction.response.send_message(
@@ -218,10 +308,30 @@ class ApproveRejectView(discord.ui.View):
             )
         await interaction.response.defer(ephemeral=True)
 
+        claimed, entry = await self._claim(interaction)
+        if not claimed:
+            return
+        handled = False
         try:
-            flip_id = await self._ensure_flip_row(interaction.guild.id)
+            flip = await self._resolve_flip(interaction, entry)
+            if not flip:
+                await interaction.followup.send(
+                    "Could not find this submission — it may already have been handled.",
+                    ephemeral=True,
+                )
+                return
+            # a queued flip already has its id, but no row yet
+            if await self._still_queued(flip):
+                await interaction.followup.send(
+                    "⏳ This submission is still waiting to be saved to the database. "
+                    "Please try again in a minute.",
+                    ephemeral=True,
+                )
+                return
+            flip_id = await self._ensure_flip_row(flip, interaction.guild.id)
             if flip_id:
-                update_flip(
+                await asyncio.to_thread(
+                    update_flip,
                     flip_id,
                     {
                         "status": "denied",
@@ -229,24 +339,14 @@ class ApproveRejectView(discord.ui.View):
                         "handled_at": "now()",
                     },
                 )
+            handled = True
 
-            member_message_id = self.flip.get("member_message_id")
+            member_message_id = flip.get("member_message_id")
             if not member_message_id and flip_id:
                 try:
-                    resp = (
-                        supabase.table("flips")
-                        .select("member_message_id")
-                        .eq("id", flip_id)
-                        .single()
-                        .execute()
+                    member_message_id = await asyncio.to_thread(
+                        get_flip_member_message_id, flip_id
                     )
-                    row = (
-                        getattr(resp, "data", None) or resp.get("data")
-                        if isinstance(resp, dict)
-                        else None
-                    )
-                    if row:
-                        member_message_id = row.get("member_message_id")
                 except Exception:
                     logger.debug(
                         "Could not fetch member_message_id for rejected flip id %s",
@@ -257,23 +357,26 @@ class ApproveRejectView(discord.ui.View):
                 await self._edit_submission_message(
                     interaction.guild,
                     int(member_message_id),
-                    self.flip["user_id"],
+                    flip["user_id"],
                     False,
                 )
             else:
                 try:
                     await interaction.message.edit(
-                        content=f"<@{self.flip['user_id']}> — Rejected ❌", view=None
+                        content=f"<@{flip['user_id']}> — Rejected ❌", view=None
                     )
                 except Exception:
                     pass
 
             await send_log_message(
                 interaction.guild,
-                f"❌ **Flip rejected:** {self.flip.get('item')} (submitted by <@{self.flip['user_id']}>)",
+                f"❌ **Flip rejected:** {flip.get('item')} (submitted by <@{flip['user_id']}>)",
             )
             # await interaction.followup.send("Flip rejected.", ephemeral=True)
 
+        except DatabaseUnavailable as e:
+            logger.warning("Could not reject flip, database unavailable: %s", e)
+            await reply_db_unavailable(interaction)
         except Exception as e:
             logger.exception("Error rejecting flip: %s", e)
             try:
@@ -285,6 +388,8 @@ class ApproveRejectView(discord.ui.View):
             await interaction.followup.send(
                 "Failed to reject flip. Check logs.", ephemeral=True
             )
+        finally:
+            pending_approvals.release(interaction.message.id, entry, handled)
 
 
 # ---- Single-step modal (all fields together) ----
@@ -305,7 +410,50 @@ class FlipModal(discord.ui.Modal, title="Submit a flip"):
         label="Sales price", style=discord.TextStyle.short, placeholder="0.00"
     )
 
+    def __init__(
+        self,
+        member_channel_id: int = None,
+        item: str = None,
+        photo: discord.Attachment = None,
+        prices: dict = None,
+    ):
+        super().__init__()
+        # resolved by /flip already, so submitting doesn't need another settings lookup
+        self.member_channel_id = member_channel_id
+        self.photo = photo
+        if item:
+            self.item.default = item[:200]
+        # what the member typed last time, when reopened to fix a mistake
+        for name, value in (prices or {}).items():
+            getattr(self, name).default = value
+
+    def parse_prices(self):
+        """({field name: cents}, [problem per unreadable field])"""
+        cents, problems = {}, []
+        for name, label in PRICE_FIELDS:
+            value = getattr(self, name).value
+            try:
+                cents[name] = parse_money(value)
+            except MoneyError as e:
+                shown = value.strip().replace("`", "'")[:40]
+                problems.append(f"• **{label}** `{shown}` {e}")
+        return cents, problems
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await drainer.admit(interaction)
+
+    @traced("flip.submit")
     async def on_submit(self, interaction: discord.Interaction):
+        # reject typos before anything is written, rather than saving a zero
+        cents, problems = self.parse_prices()
+        if problems:
+            await interaction.response.send_message(
+                "❌ Nothing was submitted — please fix:\n" + "\n".join(problems),
+                view=FixFlipView(self),
+                ephemeral=True,
+            )
+            return
+
         # Defer as ephemeral to avoid Discord timing out for slow DB/network
         await interaction.response.defer(ephemeral=True)
 
@@ -321,51 +469,69 @@ class FlipModal(discord.ui.Modal, title="Submit a flip"):
         #     sp = float(self.sales_price.value.strip() or 0.0)
         # except Exception:
         #     sp = 0.0
-        pp = clean_number(self.purchase_price.value)
-        parts = clean_number(self.parts_price.value)
-        sp = clean_number(self.sales_price.value)
+        # integer cents until the row is built, so sums don't pick up float error
+        pp = cents["purchase_price"]
+        parts = cents["parts_price"]
+        sp = cents["sales_price"]
 
         total_cost = pp + parts
         profit = sp - total_cost
 
         flip_payload = {
+            # chosen here so a retried insert or an outbox replay can't add the row twice
+            "id": str(uuid.uuid4()),
             "guild_id": interaction.guild.id,
             "user_id": interaction.user.id,
             "item": self.item.value.strip(),
-            "purchase_price": pp,
-            "parts_price": parts,
-            "sales_price": sp,
-            "total_cost": total_cost,
-            "profit": profit,
+            "purchase_price": cents_to_amount(pp),
+            "parts_price": cents_to_amount(parts),
+            "sales_price": cents_to_amount(sp),
+            "total_cost": cents_to_amount(total_cost),
+            "profit": cents_to_amount(profit),
             "status": "pending",
         }
+        # in-memory checks only; flags are shown to moderators, never block a submission
+        screen = screen_for(interaction.guild.id)
+        flags = screen.check(flip_payload)
+
+        thumbnail_url = None
+        photo_failed = False
+        if self.photo:
+            try:
+                flip_payload["photo_url"], thumbnail_url = await store_photo(
+                    self.photo, interaction.guild.id
+                )
+            except Exception as e:
+                # the flip still goes through, just without its photo
+                logger.warning("Could not store photo for flip: %s", e)
+                photo_failed = True
 
         try:
-            inserted = insert_flip(flip_payload)
-            inserted_id = None
+            outbox_id = None
 
-            if isinstance(inserted, dict) and inserted.get("id"):
-                inserted_id = inserted.get("id")
-                flip_payload["id"] = inserted_id
+            if await asyncio.to_thread(outbox.pending_count):
+                # earlier submissions are still queued; keep the DB writes in order
+                outbox_id = await asyncio.to_thread(
+                    outbox.enqueue, "insert_flip", dict(flip_payload)
+                )
             else:
                 try:
-                    possible = getattr(inserted, "data", None) or (
-                        inserted.get("data") if isinstance(inserted, dict) else None
+                    await asyncio.to_thread(insert_flip, dict(flip_payload))
+                except DatabaseUnavailable as e:
+                    logger.warning("Database unavailable, queueing flip: %s", e)
+                    outbox_id = await asyncio.to_thread(
+                        outbox.enqueue, "insert_flip", dict(flip_payload)
                     )
-                    if possible:
-                        row = (
-                            possible[0]
-                            if isinstance(possible, list) and possible
-                            else possible
-                        )
-                        if isinstance(row, dict) and row.get("id"):
-                            inserted_id = row.get("id")
-                            flip_payload["id"] = inserted_id
-                except Exception:
-                    pass
 
-            settings = ensure_guild_settings(interaction.guild.id)
-            mf_chan_id = settings.get("member_flips_channel_id")
+            if outbox_id:
+                flip_payload["outbox_id"] = outbox_id
+
+            mf_chan_id = self.member_channel_id
+            if not mf_chan_id:
+                settings = await asyncio.to_thread(
+                    ensure_guild_settings, interaction.guild.id
+                )
+                mf_chan_id = settings.get("member_flips_channel_id")
             member_channel = (
                 interaction.guild.get_channel(mf_chan_id)
                 if mf_chan_id
@@ -375,9 +541,15 @@ class FlipModal(discord.ui.Modal, title="Submit a flip"):
             )
 
             embed = build_flip_embed(
-                flip_payload, author_name=f"<@{flip_payload['user_id']}>"
+                flip_payload,
+                author_name=f"<@{flip_payload['user_id']}>",
+                flags=flags,
+                thumbnail_url=thumbnail_url,
             )
-            view = ApproveRejectView(flip_payload)
+            # the persistent view answers the clicks; stopping this copy keeps
+            # discord.py from storing one view per message
+            view = ApproveRejectView()
+            view.stop()
 
             if member_channel:
                 posted = await member_channel.send(embed=embed, view=view)
@@ -388,41 +560,29 @@ class FlipModal(discord.ui.Modal, title="Submit a flip"):
                 member_message_id = posted.id
                 flip_payload["member_message_id"] = member_message_id
 
-                if inserted_id:
-                    update_flip(inserted_id, {"member_message_id": member_message_id})
-                else:
-                    try:
-                        resp = (
-                            supabase.table("flips")
-                            .select("id")
-                            .eq("guild_id", interaction.guild.id)
-                            .eq("user_id", interaction.user.id)
-                            .eq("item", flip_payload.get("item"))
-                            .eq("status", "pending")
-                            .order("created_at", desc=True)
-                            .limit(1)
-                            .execute()
-                        )
-                        rows = getattr(resp, "data", None) or (
-                            resp.get("data") if isinstance(resp, dict) else None
-                        )
-                        if rows:
-                            candidate = rows[0]
-                            cid = candidate.get("id")
-                            if cid:
-                                flip_payload["id"] = cid
-                                update_flip(
-                                    cid, {"member_message_id": member_message_id}
-                                )
-                    except Exception:
-                        logger.exception(
-                            "Fallback: could not locate pending flip row to attach member_message_id"
+                if outbox_id:
+                    patched = await asyncio.to_thread(
+                        outbox.patch,
+                        outbox_id,
+                        {"member_message_id": member_message_id},
+                    )
+                    if not patched:
+                        logger.info(
+                            "Outbox entry %s already replayed; member_message_id not attached",
+                            outbox_id,
                         )
+                else:
+                    # approvals find the flip through pending_approvals first, so
+                    # this link can ride the next write-behind flush
+                    defer_flip_update(flip_payload, member_message_id=member_message_id)
             except Exception:
                 logger.exception(
                     "Failed to persist member_message_id for submitted flip"
                 )
 
+            pending_approvals.add(posted.id, flip_payload)
+            screen.record(flip_payload, posted.jump_url)
+
             # await interaction.followup.send(
             #     "Flip saved and posted to member-flips for admin approval.",
             #     ephemeral=True,
@@ -431,17 +591,34 @@ class FlipModal(discord.ui.Modal, title="Submit a flip"):
                 channel_mention = member_channel.mention
             else:
                 channel_mention = "#member-flips"
-
-            await interaction.followup.send(
-                f"✅ Flip saved and posted to {channel_mention} for admin approval.",
-                ephemeral=True,
+            photo_note = (
+                "\n⚠️ Your photo could not be uploaded, so it was posted without one."
+                if photo_failed
+                else ""
             )
 
+            if outbox_id:
+                await interaction.followup.send(
+                    f"✅ Flip posted to {channel_mention} for admin approval. "
+                    "The database is unreachable right now, so it will be saved automatically once it recovers."
+                    + photo_note,
+                    ephemeral=True,
+                )
+            else:
+                await interaction.followup.send(
+                    f"✅ Flip saved and posted to {channel_mention} for admin approval."
+                    + photo_note,
+                    ephemeral=True,
+                )
+
             await send_log_message(
                 interaction.guild,
-                f"📝 **Flip submitted for approval by** {interaction.user.mention} — `{flip_payload['item']}` (Profit: ${profit:,.2f})",
+                f"📝 **Flip submitted for approval by** {interaction.user.mention} — `{flip_payload['item']}` (Profit: ${flip_payload['profit']:,.2f})",
             )
 
+        except DatabaseUnavailable as e:
+            logger.warning("Could not submit flip, database unavailable: %s", e)
+            await reply_db_unavailable(interaction)
         except Exception as e:
             logger.exception("Error posting flip for approval: %s", e)
             await interaction.followup.send(
@@ -449,15 +626,105 @@ class FlipModal(discord.ui.Modal, title="Submit a flip"):
             )
 
 
+class FixFlipView(discord.ui.View):
+    """Reopens a rejected submission's modal with everything the member typed."""
+
+    def __init__(self, modal: FlipModal):
+        super().__init__(timeout=600)
+        self.member_channel_id = modal.member_channel_id
+        self.item = modal.item.value
+        self.photo = modal.photo
+        self.prices = {name: getattr(modal, name).value for name, _ in PRICE_FIELDS}
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return await drainer.admit(interaction)
+
+    @discord.ui.button(label="Fix and resubmit", style=discord.ButtonStyle.primary)
+    async def fix(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(
+            FlipModal(
+                member_channel_id=self.member_channel_id,
+                item=self.item,
+                photo=self.photo,
+                prices=self.prices,
+            )
+        )
+
+
 class FlipCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        register_queue("outbox", outbox.pending_count)
+        register_queue("pending_approvals", lambda: len(pending_approvals))
+        register_queue("write_behind", writebehind.pending_count)
+        self.bot.add_view(ApproveRejectView())
+        if not thumbnails_available():
+            logger.warning(
+                "Pillow is not installed; flip photos are stored without thumbnails."
+            )
+        self.replay_outbox.start()
+        self.flush_writes.start()
+
+    async def drain(self):
+        """Before a shutdown: one last outbox replay and write-behind flush."""
+        await self.replay_outbox()
+        await self.flush_writes()
+        left = await asyncio.to_thread(outbox.pending_count)
+        if left:
+            logger.warning("%s flip(s) still in the outbox; replayed on next start", left)
+
+    async def cog_unload(self):
+        self.replay_outbox.cancel()
+        self.flush_writes.cancel()
+        # last chance for queued updates before the process goes away
+        try:
+            await asyncio.to_thread(writebehind.flush)
+        except Exception:
+            logger.exception("Final write-behind flush failed")
+        await close_session()
+
+    @tasks.loop(seconds=writebehind.WRITE_BEHIND_SECONDS)
+    async def flush_writes(self):
+        """Send queued non-critical updates as one bulk upsert per table."""
+        try:
+            await asyncio.to_thread(writebehind.flush)
+        except Exception:
+            logger.exception("Write-behind flush failed")
+
+    @tasks.loop(seconds=OUTBOX_REPLAY_SECONDS)
+    async def replay_outbox(self):
+        """Write flips accepted during a database outage, oldest first."""
+        try:
+            replayed = await asyncio.to_thread(
+                outbox.replay, {"insert_flip": insert_flip}
+            )
+            if replayed:
+                logger.info("Replayed %s queued flip write(s)", replayed)
+        except Exception:
+            logger.exception("Outbox replay failed")
+
     @app_commands.command(name="flip", description="Submit a flip for approval")
-    async def flip(self, interaction: discord.Interaction):
-        from db.supabase import ensure_guild_settings
+    @app_commands.describe(
+        item="Item name (suggestions come from approved flips)",
+        photo="A photo of the item",
+    )
+    @traced("flip.command")
+    async def flip(
+        self,
+        interaction: discord.Interaction,
+        item: str = None,
+        photo: discord.Attachment = None,
+    ):
+        if photo:
+            try:
+                validate_attachment(photo)
+            except PhotoRejected as e:
+                await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+                return
 
-        settings = ensure_guild_settings(interaction.guild.id)
+        settings = await asyncio.to_thread(ensure_guild_settings, interaction.guild.id)
         member_flips_channel_id = settings.get("member_flips_channel_id")
         leaderboard_channel_id = settings.get("leaderboard_channel_id")
 
@@ -481,9 +748,57 @@ class FlipCog(commands.Cog):
             )
             return
 
-        modal = FlipModal()
+        modal = FlipModal(
+            member_channel_id=member_flips_channel_id, item=item, photo=photo
+        )
         await interaction.response.send_modal(modal)
 
+    @flip.autocomplete("item")
+    async def item_autocomplete(self, interaction: discord.Interaction, current: str):
+        # Discord gives autocomplete 3 seconds; a first build gets part of that
+        index = await get_item_index(interaction.guild.id, wait=AUTOCOMPLETE_BUILD_WAIT)
+        if index is None:
+            return []
+        return [
+            app_commands.Choice(name=name[:100], value=name[:100])
+            for name in index.search(current)
+        ]
+
+    @app_commands.command(
+        name="myflips", description="Show your rank, total profit and recent flips"
+    )
+    @traced("flip.myflips")
+    async def myflips(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        guild_id = interaction.guild.id
+        user_id = interaction.user.id
+        try:
+            stats = await asyncio.to_thread(get_user_stats, guild_id, user_id)
+
+            # the summary keeps the top of the leaderboard cached; rank from there first
+            rows = await asyncio.to_thread(get_leaderboard_top, guild_id, LEADERBOARD_LIMIT)
+            rank = next(
+                (i for i, r in enumerate(rows, start=1) if int(r.get("id") or 0) == user_id),
+                None,
+            )
+            if rank is None and len(rows) >= LEADERBOARD_LIMIT and stats["count"]:
+                rank = (
+                    await asyncio.to_thread(count_users_above, guild_id, stats["total"])
+                    + 1
+                )
+
+            await interaction.followup.send(
+                embed=build_user_stats_embed(interaction.user.display_name, stats, rank),
+                ephemeral=True,
+            )
+        except DatabaseUnavailable:
+            await reply_db_unavailable(interaction)
+        except Exception as e:
+            logger.exception("Failed to show flips for %s: %s", user_id, e)
+            await interaction.followup.send(
+                "Failed to load your flips — please try again later.", ephemeral=True
+            )
+
 
 async def setup(bot):
     await bot.add_cog(FlipCog(bot))
@@ -0,0 +1,115 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+import discord
+from discord.ext import commands, tasks
+from logger import get_logger
+from db.supabase import ensure_guild_settings, get_stale_pending_flips
+from db.reconcile import reconcile_incremental, DATABASE_URL
+from utils.health import register_queue
+from utils.helpers import send_log_message
+from utils.scheduler import GuildScheduler
+
+logger = get_logger("maintenance")
+
+MAINTENANCE_TICK_SECONDS = float(os.getenv("MAINTENANCE_TICK_SECONDS", "5"))
+LEADERBOARD_REFRESH_MINUTES = float(os.getenv("LEADERBOARD_REFRESH_MINUTES", "30"))
+STALE_PENDING_HOURS = float(os.getenv("STALE_PENDING_HOURS", "24"))
+STALE_REMINDER_HOURS = float(os.getenv("STALE_REMINDER_HOURS", "6"))
+RECONCILE_MINUTES = float(os.getenv("RECONCILE_MINUTES", "15"))
+REMINDER_MAX_LINES = 10
+
+
+class MaintenanceCog(commands.Cog):
+    """Periodic per-guild upkeep, spread over time by a GuildScheduler."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.scheduler = GuildScheduler()
+        self.scheduler.add_job(
+            "leaderboard", LEADERBOARD_REFRESH_MINUTES * 60, self.refresh_leaderboard
+        )
+        self.scheduler.add_job(
+            "stale_pending", STALE_REMINDER_HOURS * 3600, self.remind_stale_pending
+        )
+        # one query covers every guild, so with several shard processes only the
+        # one holding shard 0 runs it (and owns data/reconcile_state.json)
+        shard_ids = getattr(bot, "shard_ids", None)
+        if not DATABASE_URL:
+            logger.info("DATABASE_URL not set; background profit reconciliation disabled.")
+        elif shard_ids and 0 not in shard_ids:
+            logger.info("Profit reconciliation runs in the process holding shard 0.")
+        else:
+            self.scheduler.add_job(
+                "reconcile", RECONCILE_MINUTES * 60, self.reconcile, per_guild=False
+            )
+
+    async def cog_load(self):
+        register_queue("maintenance_running", self.scheduler.running)
+        self.run_scheduler.start()
+
+    async def drain(self):
+        """Start nothing new and let running jobs finish."""
+        self.run_scheduler.cancel()
+        await self.scheduler.wait()
+
+    async def cog_unload(self):
+        self.run_scheduler.cancel()
+        self.scheduler.cancel()
+
+    @tasks.loop(seconds=MAINTENANCE_TICK_SECONDS)
+    async def run_scheduler(self):
+        self.scheduler.tick(self.bot.guilds)
+
+    @run_scheduler.before_loop
+    async def before_run_scheduler(self):
+        await self.bot.wait_until_ready()
+
+    async def refresh_leaderboard(self, guild: discord.Guild):
+        """Re-post the summary; unchanged summaries are skipped by AdminCog."""
+        settings = await asyncio.to_thread(ensure_guild_settings, guild.id)
+        if not settings.get("leaderboard_channel_id"):
+            return
+        admin_cog = self.bot.get_cog("AdminCog")
+        if admin_cog:
+            await admin_cog.send_leaderboard_summary(guild)
+
+    async def remind_stale_pending(self, guild: discord.Guild):
+        """Nudge moderators (in the log channel) about flips waiting too long for review."""
+        settings = await asyncio.to_thread(ensure_guild_settings, guild.id)
+        if not settings.get("log_channel_id"):
+            return
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=STALE_PENDING_HOURS)
+        stale = await asyncio.to_thread(
+            get_stale_pending_flips, guild.id, cutoff, REMINDER_MAX_LINES + 1
+        )
+        if not stale:
+            return
+
+        channel_id = settings.get("member_flips_channel_id")
+        lines = []
+        for flip in stale[:REMINDER_MAX_LINES]:
+            line = f"• **{flip.get('item') or 'Flip'}**"
+            if channel_id and flip.get("member_message_id"):
+                line += (
+                    f" — https://discord.com/channels/{guild.id}/"
+                    f"{channel_id}/{flip['member_message_id']}"
+                )
+            lines.append(line)
+        if len(stale) > REMINDER_MAX_LINES:
+            lines.append("• …and more")
+
+        await send_log_message(
+            guild,
+            f"⏰ These flips have been waiting for review for over "
+            f"{STALE_PENDING_HOURS:g}h:\n" + "\n".join(lines),
+        )
+        logger.info("Reminded guild %s of %s stale pending flip(s)", guild.id, len(stale))
+
+    async def reconcile(self):
+        """Repair user totals that drifted from their approved flips."""
+        await asyncio.to_thread(reconcile_incremental)
+
+
+async def setup(bot):
+    await bot.add_cog(MaintenanceCog(bot))
@@ -0,0 +1,252 @@
+"""
+Cross-instance cache invalidation over Postgres LISTEN/NOTIFY.
+
+Triggers on guild_settings, users and flips publish a small JSON event on the
+`flipbot_changes` channel; every bot instance listens (DATABASE_URL, a direct
+Postgres connection string) and invalidates the matching cache entries.
+
+Install the triggers once with:
+
+    python -m db.notify --install
+"""
+
+import json
+import os
+import select
+import threading
+from logger import get_logger
+from utils.cache import settings_cache, leaderboard_cache, user_stats_cache
+
+logger = get_logger("notify")
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+CHANNEL = "flipbot_changes"
+
+TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION flipbot_notify() RETURNS trigger AS $$
+DECLARE
+    rec record;
+    payload json;
+BEGIN
+    IF TG_OP = 'DELETE' THEN rec := OLD; ELSE rec := NEW; END IF;
+    IF TG_TABLE_NAME = 'guild_settings' THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP,
+                                     'guild_id', rec.guild_id);
+    ELSIF TG_TABLE_NAME = 'users' AND TG_OP = 'UPDATE' THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP,
+                                     'guild_id', rec.guild_id, 'user_id', rec.id,
+                                     'total_profit', rec.total_profit,
+                                     'old_total_profit', OLD.total_profit);
+    ELSIF TG_TABLE_NAME = 'users' THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP,
+                                     'guild_id', rec.guild_id, 'user_id', rec.id,
+                                     'total_profit', rec.total_profit);
+    ELSIF TG_OP = 'UPDATE' THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP,
+                                     'guild_id', rec.guild_id, 'user_id', rec.user_id,
+                                     'id', rec.id, 'status', rec.status,
+                                     'profit', rec.profit, 'old_status', OLD.status,
+                                     'old_profit', OLD.profit);
+    ELSE
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP,
+                                     'guild_id', rec.guild_id, 'user_id', rec.user_id,
+                                     'id', rec.id, 'status', rec.status,
+                                     'profit', rec.profit);
+    END IF;
+    PERFORM pg_notify('{CHANNEL}', payload::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flipbot_notify ON guild_settings;
+CREATE TRIGGER flipbot_notify AFTER INSERT OR UPDATE OR DELETE ON guild_settings
+    FOR EACH ROW EXECUTE FUNCTION flipbot_notify();
+DROP TRIGGER IF EXISTS flipbot_notify ON users;
+CREATE TRIGGER flipbot_notify AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION flipbot_notify();
+DROP TRIGGER IF EXISTS flipbot_notify ON flips;
+CREATE TRIGGER flipbot_notify AFTER INSERT OR UPDATE OR DELETE ON flips
+    FOR EACH ROW EXECUTE FUNCTION flipbot_notify();
+"""
+
+# table -> list of callables(event); run on the event loop
+_subscribers = {}
+
+
+def subscribe(table: str, handler):
+    _subscribers.setdefault(table, []).append(handler)
+
+
+def dispatch(event: dict):
+    for handler in _subscribers.get(event.get("table"), []):
+        try:
+            handler(event)
+        except Exception:
+            logger.exception("Change handler failed for %s", event)
+
+
+def _invalidate_settings(event):
+    settings_cache.invalidate(event["guild_id"])
+
+
+def _moves_totals(event) -> bool:
+    """
+    Whether a change can affect totals and stats. New flips are pending, and
+    updates that leave status and profit (flips) or total_profit (users) alone,
+    e.g. attaching member_message_id or a username, don't count. Events from
+    triggers installed before old_* was added always do.
+    """
+    if event.get("table") == "users":
+        if event.get("op") == "UPDATE" and "old_total_profit" in event:
+            return event.get("total_profit") != event.get("old_total_profit")
+        return True
+    if event.get("table") != "flips":
+        return True
+    if event.get("op") == "INSERT":
+        return False
+    if event.get("op") == "UPDATE" and "old_status" in event:
+        return (event.get("status"), event.get("profit")) != (
+            event.get("old_status"),
+            event.get("old_profit"),
+        )
+    return True
+
+
+def _invalidate_leaderboard(event):
+    if _moves_totals(event):
+        leaderboard_cache.invalidate(event["guild_id"])
+
+
+def _invalidate_user_stats(event):
+    user_id = event.get("user_id")
+    if user_id is not None and _moves_totals(event):
+        user_stats_cache.invalidate(event["guild_id"], user_id)
+
+
+subscribe("guild_settings", _invalidate_settings)
+subscribe("users", _invalidate_leaderboard)
+subscribe("flips", _invalidate_leaderboard)
+subscribe("users", _invalidate_user_stats)
+subscribe("flips", _invalidate_user_stats)
+
+
+def install_triggers(dsn: str = None):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn or DATABASE_URL)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(TRIGGER_SQL)
+        logger.info("Installed change-notification triggers.")
+    finally:
+        conn.close()
+
+
+class PostgresListener:
+    """LISTENs on a dedicated connection in a daemon thread and hands events to the loop."""
+
+    def __init__(self, loop, dsn: str = None):
+        self.loop = loop
+        self.dsn = dsn or DATABASE_URL
+        self.received = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="pg-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        delay = 1
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL};")
+                logger.info("Listening for change notifications on %s", CHANNEL)
+                # anything changed while we were disconnected is unknown; start clean
+                self.loop.call_soon_threadsafe(_reset_caches)
+                delay = 1
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._deliver(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logger.warning(
+                    "Change listener disconnected (%s); reconnecting in %ss", e, delay
+                )
+                self._stop.wait(delay)
+                delay = min(delay * 2, 60)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _deliver(self, payload: str):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed change notification: %r", payload)
+            return
+        self.received += 1
+        self.loop.call_soon_threadsafe(dispatch, event)
+
+
+class LocalNotifyBus:
+    """
+    In-process stand-in for PostgresListener, used when DATABASE_URL isn't set
+    (single instance, local development, tests). `publish()` delivers an event the
+    same way a NOTIFY would.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.received = 0
+
+    def start(self):
+        logger.info("DATABASE_URL not set; using local change bus (single instance).")
+
+    def stop(self):
+        pass
+
+    def publish(self, event: dict):
+        self.received += 1
+        self.loop.call_soon_threadsafe(dispatch, event)
+
+
+def _reset_caches():
+    settings_cache.clear()
+    leaderboard_cache.clear()
+    user_stats_cache.clear()
+
+
+def start_listener(loop):
+    """
+    The running listener. Without DATABASE_URL this is a LocalNotifyBus: a
+    single instance already invalidates its caches on its own writes.
+    """
+    listener = PostgresListener(loop) if DATABASE_URL else LocalNotifyBus(loop)
+    listener.start()
+    return listener
+
+
+if __name__ == "__main__":
+    import sys
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if "--install" in sys.argv:
+        install_triggers(os.getenv("DATABASE_URL"))
+    else:
+        print(TRIGGER_SQL)
@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from logger import get_logger
+from db.resilience import DatabaseUnavailable
+
+logger = get_logger("outbox")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", os.path.join(DATA_DIR, "outbox.sqlite3"))
+
+# entries failing this many times with a non-transient error are parked as "dead"
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+_lock = threading.Lock()
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(OUTBOX_PATH), exist_ok=True)
+    conn = sqlite3.connect(OUTBOX_PATH, timeout=10)
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        # an entry left in flight by a crash is retried (delivery is at-least-once)
+        conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'inflight'")
+        conn.commit()
+        _initialized = True
+    # every accepted submission must survive a crash
+    conn.execute("PRAGMA synchronous=FULL")
+    return conn
+
+
+def enqueue(op: str, payload: dict) -> int:
+    """Append a pending DB write. Returns the outbox entry id."""
+    with _lock:
+        conn = _connect()
+        try:
+            cur = conn.execute(
+                "INSERT INTO outbox (op, payload, created_at) VALUES (?, ?, ?)",
+                (op, json.dumps(payload, default=str), time.time()),
+            )
+            conn.commit()
+            logger.info("Queued %s in outbox (entry %s)", op, cur.lastrowid)
+            return cur.lastrowid
+        finally:
+            conn.close()
+
+
+def _set_status(entry_id: int, status: str, attempts=None, error=None):
+    with _lock:
+        conn = _connect()
+        try:
+            if attempts is None:
+                conn.execute(
+                    "UPDATE outbox SET status = ? WHERE id = ?", (status, entry_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, last_error = ? WHERE id = ?",
+                    (status, attempts, error, entry_id),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def patch(entry_id: int, changes: dict) -> bool:
+    """
+    Merge `changes` into a still-pending entry's payload.
+    Returns False if the entry is already being (or has been) replayed.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT payload FROM outbox WHERE id = ? AND status = 'pending'",
+                (entry_id,),
+            ).fetchone()
+            if not row:
+                return False
+            payload = json.loads(row[0])
+            payload.update(changes)
+            conn.execute(
+                "UPDATE outbox SET payload = ? WHERE id = ?",
+                (json.dumps(payload, default=str), entry_id),
+            )
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+
+def is_pending(entry_id: int) -> bool:
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT 1 FROM outbox WHERE id = ? AND status IN ('pending', 'inflight')",
+                (entry_id,),
+            ).fetchone()
+            return row is not None
+        finally:
+            conn.close()
+
+
+def pending_count() -> int:
+    with _lock:
+        conn = _connect()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'inflight')"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+
+def replay(handlers: dict) -> int:
+    """
+    Replay pending entries in insertion order using `handlers` (op -> callable(payload)).
+    Stops at the first failure so later writes never overtake earlier ones.
+    Returns the number of entries written.
+    """
+    done = 0
+    while True:
+        with _lock:
+            conn = _connect()
+            try:
+                row = conn.execute(
+                    "SELECT id, op, payload, attempts FROM outbox "
+                    "WHERE status = 'pending' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row:
+                    # freeze the payload: patch() no longer applies once replay picked it up
+                    conn.execute(
+                        "UPDATE outbox SET status = 'inflight' WHERE id = ?", (row[0],)
+                    )
+                    conn.commit()
+            finally:
+                conn.close()
+        if not row:
+            return done
+
+        entry_id, op, payload, attempts = row
+        handler = handlers.get(op)
+        try:
+            if handler is None:
+                raise ValueError(f"no handler for outbox op {op!r}")
+            handler(json.loads(payload))
+        except DatabaseUnavailable as e:
+            _set_status(entry_id, "pending")
+            logger.info("Outbox replay paused, database still unavailable: %s", e)
+            return done
+        except Exception as e:
+            attempts += 1
+            status = "dead" if attempts >= MAX_ATTEMPTS else "pending"
+            _set_status(entry_id, status, attempts, str(e)[:500])
+            if status == "dead":
+                logger.error(
+                    "Outbox entry %s (%s) failed %s times, parking it: %s",
+                    entry_id,
+                    op,
+                    attempts,
+                    e,
+                )
+                continue
+            logger.warning("Outbox entry %s (%s) failed: %s", entry_id, op, e)
+            return done
+
+        with _lock:
+            conn = _connect()
+            try:
+                conn.execute("UPDATE outbox SET status = 'done' WHERE id = ?", (entry_id,))
+                conn.execute(
+                    "DELETE FROM outbox WHERE status = 'done' AND created_at < ?",
+                    (time.time() - 7 * 86400,),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        done += 1
+        logger.info("Replayed outbox entry %s (%s)", entry_id, op)
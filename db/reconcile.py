@@ -0,0 +1,182 @@
+"""
+Rebuild users.total_profit from the approved rows in flips.
+
+`reconcile_incremental()` only looks at users with flips handled since the last
+watermark, recomputes their totals in a single aggregate query and patches the
+rows that differ. It needs DATABASE_URL (a direct Postgres connection).
+`rebuild_guild()` recomputes every user in one guild and falls back to paging
+through PostgREST when DATABASE_URL isn't set. The fallback reads several
+snapshots rather than one, so its result is best-effort.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from logger import get_logger
+from utils.cache import leaderboard_cache, user_stats_cache
+
+logger = get_logger("reconcile")
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+STATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "reconcile_state.json"
+)
+# approvals update the flip first and the user total right after; leave recent
+# users alone so we never "fix" a total that is about to be incremented
+GRACE = timedelta(seconds=int(os.getenv("RECONCILE_GRACE_SECONDS", "120")))
+# re-scan a little before the watermark; recomputing is idempotent
+OVERLAP = timedelta(minutes=5)
+
+# totals per (guild, user) from approved flips, compared against users.total_profit
+_DIVERGING_SQL = """
+WITH scope AS ({scope}),
+agg AS (
+    SELECT s.guild_id, s.user_id,
+           ROUND(COALESCE(SUM(f.profit) FILTER (WHERE f.status = 'approved'), 0)::numeric, 2)
+               AS total
+    FROM scope s
+    LEFT JOIN flips f ON f.guild_id = s.guild_id AND f.user_id = s.user_id
+    GROUP BY s.guild_id, s.user_id
+)
+SELECT a.guild_id, a.user_id, a.total, u.total_profit, u.id IS NOT NULL AS has_row
+FROM agg a
+LEFT JOIN users u ON u.guild_id = a.guild_id AND u.id = a.user_id
+WHERE ROUND(u.total_profit::numeric, 2) IS DISTINCT FROM a.total
+  AND NOT (u.id IS NULL AND a.total = 0)
+"""
+
+_INCREMENTAL_SCOPE = """
+    SELECT DISTINCT guild_id, user_id FROM flips
+    WHERE handled_at >= %(since)s AND handled_at < %(until)s
+    EXCEPT
+    SELECT DISTINCT guild_id, user_id FROM flips WHERE handled_at >= %(until)s
+"""
+
+_GUILD_SCOPE = """
+    (SELECT guild_id, user_id FROM flips WHERE guild_id = %(guild_id)s
+     UNION
+     SELECT guild_id, id FROM users WHERE guild_id = %(guild_id)s)
+    EXCEPT
+    SELECT DISTINCT guild_id, user_id FROM flips
+    WHERE guild_id = %(guild_id)s AND handled_at >= %(until)s
+"""
+
+
+def _load_watermark():
+    try:
+        with open(STATE_PATH) as fh:
+            return datetime.fromisoformat(json.load(fh)["watermark"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_watermark(value: datetime):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump({"watermark": value.isoformat()}, fh)
+    os.replace(tmp, STATE_PATH)
+
+
+def _patch(cur, rows):
+    """Apply diverging totals. rows: (guild_id, user_id, total, old_total, has_row)."""
+    from psycopg2.extras import execute_values
+
+    updates = [(g, u, t) for g, u, t, _, has_row in rows if has_row]
+    inserts = [(u, g, str(u), t) for g, u, t, _, has_row in rows if not has_row]
+    if updates:
+        execute_values(
+            cur,
+            "UPDATE users SET total_profit = v.total FROM (VALUES %s) "
+            "AS v(guild_id, user_id, total) "
+            "WHERE users.guild_id = v.guild_id AND users.id = v.user_id",
+            updates,
+        )
+    if inserts:
+        execute_values(
+            cur,
+            "INSERT INTO users (id, guild_id, username, total_profit) VALUES %s",
+            inserts,
+        )
+    for g, u, t, old, _ in rows:
+        logger.info(
+            "Reconciled user %s in guild %s: total_profit %s -> %s", u, g, old, t
+        )
+        leaderboard_cache.invalidate(g)
+        user_stats_cache.invalidate(g, u)
+
+
+def _run_sql(scope: str, params: dict):
+    import psycopg2
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(_DIVERGING_SQL.format(scope=scope), params)
+            rows = cur.fetchall()
+            _patch(cur, rows)
+        return rows
+    finally:
+        conn.close()
+
+
+def reconcile_incremental() -> int:
+    """Fix totals of users with flips handled since the watermark. Returns rows patched."""
+    if not DATABASE_URL:
+        return 0
+    until = datetime.now(timezone.utc) - GRACE
+    watermark = _load_watermark()
+    since = (watermark - OVERLAP) if watermark else datetime.fromtimestamp(0, timezone.utc)
+    rows = _run_sql(_INCREMENTAL_SCOPE, {"since": since, "until": until})
+    _save_watermark(until)
+    if rows:
+        logger.warning("Reconciliation patched %s drifted user total(s)", len(rows))
+    return len(rows)
+
+
+def rebuild_guild(guild_id: int) -> int:
+    """Recompute every user total in a guild. Returns rows patched."""
+    if DATABASE_URL:
+        until = datetime.now(timezone.utc) - GRACE
+        return len(_run_sql(_GUILD_SCOPE, {"guild_id": guild_id, "until": until}))
+
+    # PostgREST fallback: stream approved flips and aggregate in memory (one number per user)
+    from db.supabase import (
+        iter_flips,
+        get_user_totals,
+        set_user_total,
+        get_recently_handled_users,
+    )
+
+    # same grace window as the SQL path; not atomic, so the result is best-effort
+    until = datetime.now(timezone.utc) - GRACE
+    recent = get_recently_handled_users(guild_id, until.isoformat())
+
+    totals = {}
+    for row in iter_flips(guild_id, status="approved", columns="id,user_id,profit"):
+        uid = int(row["user_id"])
+        totals[uid] = totals.get(uid, 0.0) + float(row.get("profit") or 0.0)
+
+    current = get_user_totals(guild_id)
+    # a flip handled while we were paging puts its user in `recent` too
+    recent |= get_recently_handled_users(guild_id, until.isoformat())
+    patched = 0
+    for uid in (set(totals) | set(current)) - recent:
+        new = round(totals.get(uid, 0.0), 2)
+        old = current.get(uid)
+        if old is not None and abs(float(old or 0.0) - new) < 0.005:
+            continue
+        if old is None and new == 0:
+            continue
+        set_user_total(guild_id, uid, new)
+        logger.info(
+            "Reconciled user %s in guild %s: total_profit %s -> %s",
+            uid,
+            guild_id,
+            old,
+            new,
+        )
+        patched += 1
+    if patched:
+        leaderboard_cache.invalidate(guild_id)
+    return patched
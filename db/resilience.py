@@ -0,0 +1,182 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from logger import get_logger
+from utils.tracing import span
+
+logger = get_logger("resilience")
+
+# per-operation deadlines (seconds); writes get a little longer than reads
+READ_TIMEOUT = float(os.getenv("DB_READ_TIMEOUT", "5"))
+WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "8"))
+
+# retries only apply to idempotent operations
+MAX_ATTEMPTS = int(os.getenv("DB_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.2"))
+RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", "2"))
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("DB_BREAKER_RESET", "30"))
+
+DB_UNAVAILABLE_MESSAGE = (
+    "⚠️ The database is temporarily unavailable. Please try again in a minute."
+)
+
+
+class DatabaseUnavailable(RuntimeError):
+    """Raised when the database can't be reached (timeouts, network errors, open circuit)."""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = None
+        self.total_failures = 0
+        self.total_rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return True if a call may go through. While open, lets one probe through per reset window."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at >= self.reset_timeout
+            ):
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.total_rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Database circuit closed again.")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        "Database circuit opened after %s failure(s): %s",
+                        self.failures,
+                        self.last_error,
+                    )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(
+                    0.0, self.reset_timeout - (time.monotonic() - self.opened_at)
+                )
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "total_failures": self.total_failures,
+                "rejected_calls": self.total_rejected,
+                "retry_in": round(retry_in, 1),
+                "last_error": self.last_error,
+            }
+
+
+breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+
+# DB calls run on this pool so a hung request can be abandoned at its deadline
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_POOL_SIZE", "8")), thread_name_prefix="db"
+)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Timeouts, network errors and 5xx responses are worth retrying; anything else is a real answer."""
+    if isinstance(error, (FutureTimeout, TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+
+        if isinstance(error, httpx.TransportError):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+    except ImportError:
+        pass
+    code = str(getattr(error, "code", "") or "")
+    return code.startswith("5")
+
+
+def _backoff(attempt: int) -> float:
+    # "full jitter": uniform in [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2**attempt)))
+
+
+def run(op: str, fn, *, idempotent: bool = True, timeout: float = None, probe=False):
+    """
+    Execute `fn()` under the data-layer policy: fail fast if the circuit is open,
+    enforce a per-operation deadline, and retry transient failures with jittered
+    exponential backoff when the operation is idempotent.
+
+    `probe=True` lets the call through an open circuit (used by ping).
+    """
+    if timeout is None:
+        timeout = READ_TIMEOUT if idempotent else WRITE_TIMEOUT
+    if not probe and not breaker.allow():
+        raise DatabaseUnavailable(f"{op}: database circuit is open")
+
+    with span(f"db {op}", idempotent=idempotent) as db_span:
+        return _run_attempts(op, fn, idempotent, timeout, db_span)
+
+
+def _run_attempts(op, fn, idempotent, timeout, db_span):
+    attempts = MAX_ATTEMPTS if idempotent else 1
+    last_error = None
+    for attempt in range(1, attempts + 1):
+        if db_span is not None:
+            db_span.set(attempts=attempt)
+        future = _executor.submit(fn)
+        try:
+            with span("attempt", attempt=attempt):
+                result = future.result(timeout=timeout)
+        except Exception as e:
+            if isinstance(e, FutureTimeout):
+                e = TimeoutError(f"{op} timed out after {timeout:.1f}s")
+            if not _is_transient(e):
+                # the database answered, it just didn't like the request
+                breaker.record_success()
+                raise e
+            breaker.record_failure(e)
+            last_error = e
+            logger.warning("%s attempt %s/%s failed: %s", op, attempt, attempts, e)
+            if attempt < attempts and breaker.allow():
+                time.sleep(_backoff(attempt))
+                continue
+            break
+        breaker.record_success()
+        return result
+
+    raise DatabaseUnavailable(f"{op} failed: {last_error}") from last_error
@@ -1,37 +1,124 @@
 import os
-from supabase import create_client, Client
+import threading
+import uuid
 from logger import get_logger
 from datetime import datetime
+from utils.cache import settings_cache, leaderboard_cache, user_stats_cache
+from db.writebehind import defer_upsert
+from db.resilience import (
+    run,
+    breaker,
+    DatabaseUnavailable,
+    READ_TIMEOUT,
+    WRITE_TIMEOUT,
+)
 
 logger = get_logger("supabase")
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    logger.error("SUPABASE_URL or SUPABASE_KEY missing in environment variables.")
-    raise RuntimeError("Supabase credentials not set (SUPABASE_URL / SUPABASE_KEY).")
+# shared connection pool for every Supabase call (PostgREST, storage, ...)
+HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1"
+POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX", "20"))
+POOL_KEEPALIVE = int(os.getenv("SUPABASE_POOL_KEEPALIVE", "10"))
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+_client = None
+_client_lock = threading.Lock()
+
+
+def _build_http_client():
+    import httpx
+
+    # the HTTP timeout backs up the per-operation deadlines so abandoned requests don't linger
+    kwargs = dict(
+        timeout=httpx.Timeout(max(READ_TIMEOUT, WRITE_TIMEOUT), connect=5.0),
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_KEEPALIVE,
+            keepalive_expiry=60.0,
+        ),
+        follow_redirects=True,
+    )
+    if HTTP2:
+        try:
+            return httpx.Client(http2=True, **kwargs)
+        except ImportError:
+            logger.warning("HTTP/2 requested but the 'h2' package is missing; using HTTP/1.1.")
+    return httpx.Client(**kwargs)
+
+
+def get_client():
+    """
+    The shared Supabase client, created on first use. Importing this module needs
+    neither credentials nor the supabase package, which keeps startup fast and
+    lets helpers be imported without a database.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            if not SUPABASE_URL or not SUPABASE_KEY:
+                logger.error(
+                    "SUPABASE_URL or SUPABASE_KEY missing in environment variables."
+                )
+                raise RuntimeError(
+                    "Supabase credentials not set (SUPABASE_URL / SUPABASE_KEY)."
+                )
+            from supabase import create_client, ClientOptions
+
+            _client = create_client(
+                SUPABASE_URL,
+                SUPABASE_KEY,
+                options=ClientOptions(
+                    postgrest_client_timeout=max(READ_TIMEOUT, WRITE_TIMEOUT),
+                    httpx_client=_build_http_client(),
+                ),
+            )
+            logger.debug("Supabase client initialised (http2=%s)", HTTP2)
+    return _client
+
+
+class _LazyClient:
+    """Stands in for the client object so `supabase.table(...)` keeps working everywhere."""
+
+    def __getattr__(self, name):
+        return getattr(get_client(), name)
+
+
+supabase = _LazyClient()
+
+
+def _rows(res):
+    data = getattr(res, "data", None)
+    if data is None and isinstance(res, dict):
+        data = res.get("data")
+    return data or []
 
 
 # DB wrapper functions with basic error handling
 def insert_flip(flip: dict):
+    """
+    Insert a flip under its client-generated `id`. A row that already landed
+    (timed-out attempt, outbox replay) is left alone, so this is safe to retry.
+    """
+    # outbox entries queued before ids were generated client-side
+    flip.setdefault("id", str(uuid.uuid4()))
     try:
-        res = supabase.table("flips").insert(flip).execute()
+        res = run(
+            "insert_flip",
+            lambda: supabase.table("flips")
+            .upsert(flip, on_conflict="id", ignore_duplicates=True)
+            .execute(),
+            timeout=WRITE_TIMEOUT,
+        )
         logger.debug("insert_flip result: %s", res)
-        # Try to return the inserted row(s) data robustly
-        try:
-            data = getattr(res, "data", None) or (
-                res.get("data") if isinstance(res, dict) else None
-            )
-            if data:
-                # return the first inserted row (most uses expect dict)
-                return data[0] if isinstance(data, list) else data
-        except Exception:
-            pass
-        # Fallback: return whole res
-        return res
+        # an ignored duplicate returns no rows
+        data = _rows(res)
+        if data:
+            return data[0] if isinstance(data, list) else data
+        return flip
     except Exception as e:
         logger.exception("Failed to insert flip: %s", e)
         raise
@@ -40,26 +127,151 @@ def insert_flip(flip: dict):
 def get_pending_flips(guild_id: int):
     try:
         # pass boolean for ascending (True = ascending)
-        res = (
-            supabase.table("flips")
+        res = run(
+            "get_pending_flips",
+            lambda: supabase.table("flips")
             .select("*")
             .eq("guild_id", guild_id)
             .eq("status", "pending")
             .order("submitted_at", desc=False)  # ascending = True
-            .execute()
+            .execute(),
         )
         return res.data or []
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         logger.exception("Failed to fetch pending flips: %s", e)
         return []
 
 
+def get_stale_pending_flips(guild_id: int, older_than: datetime, limit: int = 25):
+    """Pending flips submitted before `older_than` (UTC), oldest first."""
+    res = run(
+        "get_stale_pending_flips",
+        lambda: supabase.table("flips")
+        .select("id,user_id,item,submitted_at,member_message_id")
+        .eq("guild_id", guild_id)
+        .eq("status", "pending")
+        .lt("submitted_at", older_than.isoformat())
+        .order("submitted_at", desc=False)
+        .limit(limit)
+        .execute(),
+    )
+    return _rows(res)
+
+
+def find_latest_pending_flip(guild_id: int, user_id: int, item: str):
+    """Most recent pending flip by this submitter for this item, or None."""
+    res = run(
+        "find_latest_pending_flip",
+        lambda: supabase.table("flips")
+        .select("*")
+        .eq("guild_id", guild_id)
+        .eq("user_id", user_id)
+        .eq("item", item)
+        .eq("status", "pending")
+        .order("created_at", desc=True)
+        .limit(1)
+        .execute(),
+    )
+    rows = _rows(res)
+    return rows[0] if rows else None
+
+
+def get_flip_member_message_id(flip_id: str):
+    res = run(
+        "get_flip_member_message_id",
+        lambda: supabase.table("flips")
+        .select("member_message_id")
+        .eq("id", flip_id)
+        .limit(1)
+        .execute(),
+    )
+    rows = _rows(res)
+    return rows[0].get("member_message_id") if rows else None
+
+
+def get_flip_by_message_id(guild_id: int, message_id: int):
+    """The flip posted as `message_id` in the member-flips channel, or None."""
+    res = run(
+        "get_flip_by_message_id",
+        lambda: supabase.table("flips")
+        .select("id,guild_id,user_id,item,profit,status")
+        .eq("guild_id", guild_id)
+        .eq("member_message_id", message_id)
+        .limit(1)
+        .execute(),
+    )
+    rows = _rows(res)
+    return rows[0] if rows else None
+
+
+def iter_flips(
+    guild_id: int,
+    status: str = None,
+    since: str = None,
+    until: str = None,
+    columns: str = "*",
+    page_size: int = 500,
+):
+    """
+    Yield a guild's flips one row at a time, fetching `page_size` rows per request.
+    Filters are applied server-side so only matching rows are transferred;
+    memory use stays at one page regardless of how many flips the guild has.
+    Each page starts after the last (submitted_at, id) seen rather than at an
+    offset, so deep pages stay cheap and rows inserted meanwhile can't make a
+    row repeat or go missing. Rows always include submitted_at and id.
+    """
+    if columns != "*":
+        wanted = [c.strip() for c in columns.split(",")]
+        columns = ",".join(dict.fromkeys(wanted + ["submitted_at", "id"]))
+    after = None
+    while True:
+
+        def fetch_page(after=after):
+            qry = supabase.table("flips").select(columns).eq("guild_id", guild_id)
+            if status:
+                qry = qry.eq("status", status)
+            if since:
+                qry = qry.gte("submitted_at", since)
+            if until:
+                qry = qry.lt("submitted_at", until)
+            if after:
+                ts, last_id = after
+                qry = qry.or_(
+                    f'submitted_at.gt."{ts}",'
+                    f'and(submitted_at.eq."{ts}",id.gt."{last_id}")'
+                )
+            return (
+                qry.order("submitted_at", desc=False)
+                .order("id", desc=False)
+                .limit(page_size)
+                .execute()
+            )
+
+        try:
+            res = run("iter_flips", fetch_page)
+        except Exception as e:
+            logger.exception("Failed to fetch flips page after %s: %s", after, e)
+            raise
+        rows = res.data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["submitted_at"], rows[-1]["id"])
+
+
 def update_flip(flip_id: str, changes: dict):
     try:
         # If handled_at is provided as 'now()', replace with actual timestamp
         if changes.get("handled_at") == "now()":
             changes["handled_at"] = datetime.utcnow().isoformat()
-        res = supabase.table("flips").update(changes).eq("id", flip_id).execute()
+        # setting columns to fixed values is safe to repeat
+        res = run(
+            "update_flip",
+            lambda: supabase.table("flips").update(changes).eq("id", flip_id).execute(),
+            timeout=WRITE_TIMEOUT,
+        )
         logger.debug("update_flip result: %s", res)
         return res
     except Exception as e:
@@ -74,21 +286,36 @@ def add_user_profit(guild_id: int, user_id: int, username: str, profit: float):
         profit = float(profit or 0.0)
 
         # Try fetching existing record
-        existing = (
-            supabase.table("users")
+        existing = run(
+            "add_user_profit.select",
+            lambda: supabase.table("users")
             .select("*")
             .eq("id", user_id)
             .eq("guild_id", guild_id)
-            .execute()
+            .execute(),
         )
 
         if existing and getattr(existing, "data", None):
             current = existing.data[0]
             current_total = float(current.get("total_profit") or 0.0)
             new_total = current_total + profit
-            supabase.table("users").update(
-                {"total_profit": new_total, "username": username}
-            ).eq("id", user_id).eq("guild_id", guild_id).execute()
+            # writes an absolute total computed above, so a retry can't double-count
+            run(
+                "add_user_profit.update",
+                lambda: supabase.table("users")
+                .update({"total_profit": new_total})
+                .eq("id", user_id)
+                .eq("guild_id", guild_id)
+                .execute(),
+                timeout=WRITE_TIMEOUT,
+            )
+            if username != current.get("username"):
+                # display name only; it can trail the total by a flush interval
+                defer_upsert(
+                    "users",
+                    {"id": user_id, "guild_id": guild_id, "username": username},
+                    key=("id", "guild_id"),
+                )
             logger.debug(
                 "Updated user %s in guild %s total_profit -> %s",
                 user_id,
@@ -104,9 +331,19 @@ def add_user_profit(guild_id: int, user_id: int, username: str, profit: float):
                 "total_profit": profit,
             }
             try:
-                supabase.table("users").upsert(row).execute()
+                run(
+                    "add_user_profit.upsert",
+                    lambda: supabase.table("users").upsert(row).execute(),
+                    timeout=WRITE_TIMEOUT,
+                )
+            except DatabaseUnavailable:
+                raise
             except Exception:
-                supabase.table("users").insert(row).execute()
+                run(
+                    "add_user_profit.insert",
+                    lambda: supabase.table("users").insert(row).execute(),
+                    idempotent=False,
+                )
 
             logger.debug(
                 "Inserted new user %s in guild %s with profit %s",
@@ -115,57 +352,289 @@ def add_user_profit(guild_id: int, user_id: int, username: str, profit: float):
                 profit,
             )
 
+        leaderboard_cache.invalidate(guild_id)
+
     except Exception as e:
         logger.exception("Failed to add user profit: %s", e)
         raise
 
 
+def get_user_totals(guild_id: int) -> dict:
+    """{user_id: total_profit} for every user row in a guild."""
+    totals = {}
+    start, page_size = 0, 1000
+    while True:
+        res = run(
+            "get_user_totals",
+            lambda start=start: supabase.table("users")
+            .select("id,total_profit")
+            .eq("guild_id", guild_id)
+            .order("id", desc=False)
+            .range(start, start + page_size - 1)
+            .execute(),
+        )
+        rows = _rows(res)
+        for r in rows:
+            totals[int(r["id"])] = r.get("total_profit")
+        if len(rows) < page_size:
+            return totals
+        start += page_size
+
+
+def get_recently_handled_users(guild_id: int, since: str) -> set:
+    """Ids of users in a guild with a flip approved or rejected at or after `since`."""
+    res = run(
+        "get_recently_handled_users",
+        lambda: supabase.table("flips")
+        .select("user_id")
+        .eq("guild_id", guild_id)
+        .gte("handled_at", since)
+        .execute(),
+    )
+    return {int(r["user_id"]) for r in _rows(res)}
+
+
+def set_user_total(guild_id: int, user_id: int, total: float):
+    """Overwrite a user's total (reconciliation); creates the row if it is missing."""
+    row = {"id": int(user_id), "guild_id": int(guild_id), "total_profit": total}
+    existing = run(
+        "set_user_total.select",
+        lambda: supabase.table("users")
+        .select("id")
+        .eq("id", user_id)
+        .eq("guild_id", guild_id)
+        .execute(),
+    )
+    if _rows(existing):
+        run(
+            "set_user_total.update",
+            lambda: supabase.table("users")
+            .update({"total_profit": total})
+            .eq("id", user_id)
+            .eq("guild_id", guild_id)
+            .execute(),
+            timeout=WRITE_TIMEOUT,
+        )
+    else:
+        row["username"] = str(user_id)
+        run(
+            "set_user_total.upsert",
+            lambda: supabase.table("users").upsert(row).execute(),
+            timeout=WRITE_TIMEOUT,
+        )
+    leaderboard_cache.invalidate(guild_id)
+    user_stats_cache.invalidate(guild_id, user_id)
+
+
 def get_leaderboard_top(guild_id: int, limit: int = 10):
+    cached = leaderboard_cache.get(guild_id)
+    if cached and cached[0] >= limit:
+        return cached[1][:limit]
     try:
         # order by total_profit descending => second arg False (ascending=False)
-        res = (
-            supabase.table("users")
+        res = run(
+            "get_leaderboard_top",
+            lambda: supabase.table("users")
             .select("*")
             .eq("guild_id", guild_id)
             .order("total_profit", desc=True)  # ascending = False -> descending order
             .limit(limit)
-            .execute()
+            .execute(),
         )
-        return res.data or []
+        rows = res.data or []
+        leaderboard_cache.set(guild_id, (limit, rows))
+        return rows
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         logger.exception("Failed to get leaderboard: %s", e)
         return []
 
 
+USER_RECENT_FLIPS = 5
+
+
+def get_user_stats(guild_id: int, user_id: int) -> dict:
+    """
+    A member's total profit, approved-flip count and most recent approved flips:
+    {"total": float, "count": int, "recent": [{"item", "profit", "handled_at"}, ...]}.
+    Cached per user and kept current by note_approved_flip().
+    """
+    cached = user_stats_cache.get(guild_id, user_id)
+    if cached is not None:
+        return cached
+
+    user = run(
+        "get_user_stats.user",
+        lambda: supabase.table("users")
+        .select("total_profit")
+        .eq("guild_id", guild_id)
+        .eq("id", user_id)
+        .limit(1)
+        .execute(),
+    )
+    # one request for both the count and the latest rows
+    flips = run(
+        "get_user_stats.flips",
+        lambda: supabase.table("flips")
+        .select("item,profit,handled_at", count="exact")
+        .eq("guild_id", guild_id)
+        .eq("user_id", user_id)
+        .eq("status", "approved")
+        .order("handled_at", desc=True)
+        .limit(USER_RECENT_FLIPS)
+        .execute(),
+    )
+    user_rows = _rows(user)
+    recent = _rows(flips)
+    stats = {
+        "total": float((user_rows[0].get("total_profit") if user_rows else 0) or 0.0),
+        "count": flips.count if flips.count is not None else len(recent),
+        "recent": recent,
+    }
+    user_stats_cache.set(guild_id, user_id, stats)
+    return stats
+
+
+def note_approved_flip(guild_id: int, user_id: int, flip: dict):
+    """Fold a just-approved flip into the member's cached stats (no DB round trip)."""
+    profit = float(flip.get("profit") or 0.0)
+    entry = {
+        "item": flip.get("item"),
+        "profit": profit,
+        "handled_at": datetime.utcnow().isoformat(),
+    }
+
+    def apply(stats):
+        stats["total"] += profit
+        stats["count"] += 1
+        stats["recent"] = [entry] + stats["recent"][: USER_RECENT_FLIPS - 1]
+
+    user_stats_cache.update(guild_id, user_id, apply)
+
+
+def count_users_above(guild_id: int, total: float) -> int:
+    """How many members of a guild have a higher total profit than `total`."""
+    res = run(
+        "count_users_above",
+        lambda: supabase.table("users")
+        .select("id", count="exact")
+        .eq("guild_id", guild_id)
+        .gt("total_profit", total)
+        .limit(1)
+        .execute(),
+    )
+    return res.count or 0
+
+
 def ensure_guild_settings(guild_id: int):
+    """
+    Fetch (or create) the settings row for a guild.
+    Raises on failure instead of returning a stub, so callers don't mistake an
+    outage for an unconfigured guild.
+    """
+    cached = settings_cache.get(guild_id)
+    if cached is not None:
+        return dict(cached)
     try:
-        res = (
-            supabase.table("guild_settings")
+        res = run(
+            "ensure_guild_settings",
+            lambda: supabase.table("guild_settings")
             .select("*")
             .eq("guild_id", guild_id)
-            .execute()
+            .execute(),
         )
         if res.data:
-            return res.data[0]
+            settings_cache.set(guild_id, res.data[0])
+            return dict(res.data[0])
         else:
-            supabase.table("guild_settings").insert({"guild_id": guild_id}).execute()
+            run(
+                "ensure_guild_settings.insert",
+                lambda: supabase.table("guild_settings")
+                .upsert({"guild_id": guild_id})
+                .execute(),
+                timeout=WRITE_TIMEOUT,
+            )
+            settings_cache.set(guild_id, {"guild_id": guild_id})
             return {"guild_id": guild_id}
     except Exception as e:
-        logger.exception("Failed to ensure guild settings: %s", e)
-        # fallback minimal settings
-        return {"guild_id": guild_id}
+        logger.error("Failed to ensure guild settings for %s: %s", guild_id, e)
+        raise
+
+
+def upsert_guild_settings(guild_id: int, **fields):
+    row = {"guild_id": guild_id, **fields}
+    try:
+        res = run(
+            "upsert_guild_settings",
+            lambda: supabase.table("guild_settings").upsert(row).execute(),
+            timeout=WRITE_TIMEOUT,
+        )
+        settings_cache.invalidate(guild_id)
+        return res
+    except Exception as e:
+        logger.exception("Failed to upsert guild settings: %s", e)
+        raise
+
+
+def defer_guild_settings(guild_id: int, **fields):
+    """
+    Write-behind variant of upsert_guild_settings for values only the bot reads
+    back. The cached settings are updated right away so this process sees them.
+    """
+    cached = settings_cache.get(guild_id)
+    if cached is not None:
+        settings_cache.set(guild_id, {**cached, **fields})
+    defer_upsert("guild_settings", {"guild_id": guild_id, **fields}, key=("guild_id",))
+
+
+# columns set at submission and never changed afterwards
+_FLIP_SUBMISSION_COLUMNS = (
+    "guild_id",
+    "user_id",
+    "item",
+    "purchase_price",
+    "parts_price",
+    "sales_price",
+    "total_cost",
+    "profit",
+)
+
+
+def defer_flip_update(flip: dict, **changes):
+    """
+    Write-behind update of a flip row. The submission columns ride along because
+    an upsert is checked as an insert first; their values can't have changed.
+    """
+    row = {k: flip[k] for k in _FLIP_SUBMISSION_COLUMNS if k in flip}
+    row.update(changes)
+    row["id"] = flip["id"]
+    defer_upsert("flips", row)
 
 
 # Simple ping to check the connection
 def ping():
+    # probe=True: ping is allowed through an open circuit and closes it on success
     try:
         # select now from pg to test connectivity via RPC
-        res = supabase.rpc("now").execute()  # might fail; fallback to a simple select
+        run("ping.rpc", lambda: supabase.rpc("now").execute(), probe=True)
         return True, "OK"
     except Exception:
         try:
-            res = supabase.table("guild_settings").select("guild_id").limit(1).execute()
+            run(
+                "ping.select",
+                lambda: supabase.table("guild_settings")
+                .select("guild_id")
+                .limit(1)
+                .execute(),
+                probe=True,
+            )
             return True, "OK"
         except Exception as e:
             logger.exception("Supabase ping failed: %s", e)
             return False, str(e)
+
+
+def db_health() -> dict:
+    """Circuit breaker state for diagnostics (/pingdb)."""
+    return breaker.snapshot()
@@ -0,0 +1,121 @@
+"""
+Write-behind queue for updates nobody waits on.
+
+Handlers queue a partial row with `defer_upsert()` and carry on; rows for the
+same primary key are merged, and `flush()` (driven by FlipCog every
+WRITE_BEHIND_SECONDS, and once more on shutdown) sends each table's rows as a
+single bulk upsert. Only use it for writes whose result doesn't change the
+response to the user, and include every NOT NULL column without a default: an
+upsert is checked as an insert first, even when it ends up updating.
+"""
+
+import os
+import threading
+from logger import get_logger
+from db.resilience import run, DatabaseUnavailable, WRITE_TIMEOUT
+
+logger = get_logger("writebehind")
+
+WRITE_BEHIND_SECONDS = float(os.getenv("WRITE_BEHIND_SECONDS", "2"))
+MAX_PENDING_ROWS = 10000
+BATCH_SIZE = 500
+
+_lock = threading.Lock()
+# (table, key columns) -> {key values: row}
+_pending = {}
+stats = {"queued": 0, "merged": 0, "flushed": 0, "failed_flushes": 0, "dropped": 0}
+
+
+def defer_upsert(table: str, row: dict, key=("id",)):
+    """
+    Queue `row` for the next flush. `key` names the table's primary-key columns
+    (the upsert's conflict target); `row` must contain them.
+    """
+    key = tuple(key)
+    ident = tuple(row[k] for k in key)
+    with _lock:
+        rows = _pending.setdefault((table, key), {})
+        if ident in rows:
+            rows[ident].update(row)
+            stats["merged"] += 1
+        else:
+            if _pending_rows() >= MAX_PENDING_ROWS:
+                # these writes are best-effort by definition; don't grow without bound
+                stats["dropped"] += 1
+                logger.warning("Write-behind queue full; dropping %s update", table)
+                return
+            rows[ident] = dict(row)
+        stats["queued"] += 1
+
+
+def pending_count() -> int:
+    # read from other threads (health endpoint) while handlers add tables
+    with _lock:
+        return _pending_rows()
+
+
+def _pending_rows() -> int:
+    """Rows queued across all tables; the caller holds `_lock`."""
+    return sum(len(rows) for rows in _pending.values())
+
+
+def _requeue(table, key, rows):
+    """Put back rows that failed to flush, without clobbering newer values."""
+    with _lock:
+        pending = _pending.setdefault((table, key), {})
+        for row in rows:
+            ident = tuple(row[k] for k in key)
+            pending[ident] = {**row, **pending.get(ident, {})}
+
+
+def flush() -> int:
+    """Write everything queued so far. Returns rows written; failures are re-queued."""
+    with _lock:
+        batches = list(_pending.items())
+        _pending.clear()
+
+    written = 0
+    for (table, key), rows in batches:
+        # PostgREST wants the same columns in every row of a bulk upsert
+        by_columns = {}
+        for row in rows.values():
+            by_columns.setdefault(frozenset(row), []).append(row)
+        for group in by_columns.values():
+            for start in range(0, len(group), BATCH_SIZE):
+                chunk = group[start : start + BATCH_SIZE]
+                try:
+                    run(
+                        f"write_behind.{table}",
+                        lambda: run_upsert(table, chunk),
+                        timeout=WRITE_TIMEOUT,
+                    )
+                    written += len(chunk)
+                except DatabaseUnavailable as e:
+                    stats["failed_flushes"] += 1
+                    logger.warning(
+                        "Write-behind flush of %s %s row(s) failed, will retry: %s",
+                        len(chunk),
+                        table,
+                        e,
+                    )
+                    _requeue(table, key, chunk)
+                except Exception as e:
+                    # the database rejected the rows; retrying won't change that
+                    stats["failed_flushes"] += 1
+                    stats["dropped"] += len(chunk)
+                    logger.exception(
+                        "Dropping %s write-behind %s row(s): %s", len(chunk), table, e
+                    )
+    stats["flushed"] += written
+    return written
+
+
+def run_upsert(table: str, rows):
+    from db.supabase import supabase
+
+    # conflicts resolve on the primary key; only the columns in `rows` are written
+    return (
+        supabase.table(table)
+        .upsert(rows, default_to_null=False, returning="minimal")
+        .execute()
+    )
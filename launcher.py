@@ -0,0 +1,166 @@
+"""
+Run the bot as several shard processes.
+
+    python launcher.py                 # one process per CPU, shard count from Discord
+    SHARD_COUNT=8 PROCESSES=4 python launcher.py
+
+Each child runs bot.py with SHARD_COUNT / SHARD_IDS set, its own log file and
+outbox, and (if HEALTH_PORT is set) its own health port: HEALTH_PORT + index.
+Children that exit unexpectedly are restarted with a backoff.
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+import aiohttp
+from dotenv import load_dotenv
+from logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("launcher")
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+RESTART_BACKOFF_MAX = 60
+
+
+async def recommended_shard_count(token: str) -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {token}"},
+        ) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+            return int(data["shards"])
+
+
+def split_shards(shard_count: int, processes: int):
+    """Contiguous shard ranges, one per process."""
+    processes = max(1, min(processes, shard_count))
+    per, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for i in range(processes):
+        size = per + (1 if i < extra else 0)
+        groups.append(list(range(start, start + size)))
+        start += size
+    return groups
+
+
+class ShardProcess:
+    def __init__(self, index: int, shard_ids, shard_count: int):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.proc = None
+        self.restarts = 0
+        self.next_start = 0.0
+        self.terminated = False
+
+    def env(self):
+        env = dict(os.environ)
+        env["SHARD_COUNT"] = str(self.shard_count)
+        env["SHARD_IDS"] = ",".join(str(s) for s in self.shard_ids)
+        env["LOG_FILE"] = f"bot-{self.index}.log"
+        # guilds never move between processes, so a per-process outbox keeps their order
+        env["OUTBOX_PATH"] = os.path.join(
+            os.path.dirname(BOT_SCRIPT), "data", f"outbox-{self.index}.sqlite3"
+        )
+        if os.getenv("HEALTH_PORT"):
+            env["HEALTH_PORT"] = str(int(os.getenv("HEALTH_PORT")) + self.index)
+        return env
+
+    def start(self):
+        # own session: Ctrl-C reaches only the launcher, which forwards one SIGTERM
+        # (a second signal would make the child skip its drain)
+        self.terminated = False
+        self.proc = subprocess.Popen(
+            [sys.executable, BOT_SCRIPT], env=self.env(), start_new_session=True
+        )
+        logger.info(
+            "Started process %s (pid %s) for shards %s",
+            self.index,
+            self.proc.pid,
+            self.shard_ids,
+        )
+
+    def terminate(self):
+        """Ask the process to drain and exit; only once, as a second signal skips the drain."""
+        if self.proc and self.proc.poll() is None and not self.terminated:
+            self.terminated = True
+            self.proc.send_signal(signal.SIGTERM)
+
+
+def main():
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        logger.error("DISCORD_TOKEN missing.")
+        raise SystemExit("DISCORD_TOKEN missing.")
+
+    shard_count = int(os.getenv("SHARD_COUNT") or 0)
+    if not shard_count:
+        shard_count = asyncio.run(recommended_shard_count(token))
+    processes = int(os.getenv("PROCESSES") or os.cpu_count() or 1)
+
+    children = [
+        ShardProcess(i, ids, shard_count)
+        for i, ids in enumerate(split_shards(shard_count, processes))
+    ]
+    logger.info(
+        "Launching %s shard(s) across %s process(es)", shard_count, len(children)
+    )
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children:
+            child.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for child in children:
+        if stopping:
+            # stopped during the staggered start; the rest never get started
+            break
+        child.start()
+        if stopping:
+            # the signal landed while this one was starting
+            child.terminate()
+            break
+        # stagger logins a little; Discord limits concurrent shard logins
+        time.sleep(5)
+
+    while not stopping:
+        time.sleep(1)
+        for child in children:
+            code = child.proc.poll()
+            if code is None or stopping:
+                continue
+            if not child.next_start:
+                child.restarts += 1
+                delay = min(RESTART_BACKOFF_MAX, 2**child.restarts)
+                child.next_start = time.monotonic() + delay
+                logger.warning(
+                    "Process %s exited with %s; restarting in %ss",
+                    child.index,
+                    code,
+                    delay,
+                )
+            elif time.monotonic() >= child.next_start:
+                child.next_start = 0.0
+                child.start()
+
+    for child in children:
+        if child.proc:
+            child.proc.wait()
+    logger.info("All shard processes stopped.")
+
+
+if __name__ == "__main__":
+    main()
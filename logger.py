@@ -1,11 +1,172 @@
+import glob
+import gzip
 import logging
-from logging.handlers import RotatingFileHandler
 import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
 
 LOG_DIR = os.path.join(os.path.dirname(__file__), "data", "rotating_logs")
+# each shard process gets its own file (set by launcher.py); rotation isn't multi-process safe
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "5")) * 1024 * 1024)
+# retention for rotated (gzipped) files: total size budget and maximum age
+LOG_MAX_TOTAL_BYTES = int(float(os.getenv("LOG_MAX_TOTAL_MB", "100")) * 1024 * 1024)
+LOG_MAX_AGE_DAYS = float(os.getenv("LOG_MAX_AGE_DAYS", "14"))
+# age-based retention also runs this often when nothing rotates
+PRUNE_INTERVAL = 3600
+# identical exceptions are logged once per window; repeats are counted instead
+LOG_REPEAT_WINDOW = float(os.getenv("LOG_REPEAT_WINDOW", "60"))
 os.makedirs(LOG_DIR, exist_ok=True)
 
 
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    """
+    Size-based rotation that gzips rotated files on a background thread and
+    keeps them within a total size budget and a maximum age, oldest removed first.
+    """
+
+    def __init__(self, filename, max_bytes, max_total_bytes, max_age_days):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=0)
+        self.max_total_bytes = max_total_bytes
+        self.max_age = max_age_days * 86400
+        self._jobs = queue.Queue()
+        threading.Thread(target=self._work, name="log-compressor", daemon=True).start()
+        # pick up anything left uncompressed by a previous run
+        for path in glob.glob(self.baseFilename + ".*"):
+            if not path.endswith(".gz"):
+                self._jobs.put(path)
+        # apply retention now rather than at the first rollover, which a quiet
+        # bot may never reach
+        self._jobs.put(None)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        rotated = f"{self.baseFilename}.{stamp}"
+        n = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{self.baseFilename}.{stamp}-{n}"
+            n += 1
+        if os.path.exists(self.baseFilename):
+            os.rename(self.baseFilename, rotated)
+            self._jobs.put(rotated)
+        if not self.delay:
+            self.stream = self._open()
+
+    def _work(self):
+        while True:
+            try:
+                # None (or an idle hour) means "just prune"
+                path = self._jobs.get(timeout=PRUNE_INTERVAL)
+            except queue.Empty:
+                path = None
+            try:
+                if path is not None:
+                    self._compress(path)
+                self._prune()
+            except Exception as e:
+                # never log from here: this runs inside the logging machinery
+                try:
+                    sys.stderr.write(f"Log rotation maintenance failed for {path}: {e}\n")
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _compress(path):
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.remove(path)
+
+    def _prune(self):
+        rotated = []
+        for path in glob.glob(self.baseFilename + ".*.gz"):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rotated.append((st.st_mtime, st.st_size, path))
+        rotated.sort(reverse=True)  # newest first
+        now = time.time()
+        total = 0
+        for mtime, size, path in rotated:
+            total += size
+            if total > self.max_total_bytes or now - mtime > self.max_age:
+                os.remove(path)
+
+
+class RepeatedExceptionFilter(logging.Filter):
+    """
+    Lets the first occurrence of an exception (same exception type raised from
+    the same place) through per LOG_REPEAT_WINDOW and drops the rest. The next
+    one that gets through reports how many were suppressed.
+    """
+
+    def __init__(self, window: float = LOG_REPEAT_WINDOW):
+        super().__init__()
+        self.window = window
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(record):
+        exc_type, exc, tb = record.exc_info
+        while tb is not None and tb.tb_next is not None:
+            tb = tb.tb_next
+        origin = (tb.tb_frame.f_code.co_filename, tb.tb_lineno) if tb else None
+        return (record.name, record.pathname, record.lineno, exc_type, origin)
+
+    def filter(self, record):
+        if not record.exc_info or self.window <= 0:
+            return True
+        key = self._key(record)
+        now = time.monotonic()
+        with self._lock:
+            first, suppressed = self._seen.get(key, (None, 0))
+            if first is not None and now - first < self.window:
+                self._seen[key] = (first, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+            if len(self._seen) > 1000:
+                for k in [k for k, v in self._seen.items() if now - v[0] >= self.window]:
+                    del self._seen[k]
+        if suppressed and isinstance(record.msg, str):
+            record.msg += (
+                f" [{suppressed} identical error(s) suppressed in the previous "
+                f"{self.window:g}s]"
+            )
+        return True
+
+
+_handlers = []
+_repeat_filter = RepeatedExceptionFilter()
+
+
+def _shared_handlers():
+    # one handler per destination: several handlers rotating the same file would clobber it
+    if not _handlers:
+        fmt = logging.Formatter("%(asctime)s — %(levelname)s — %(name)s — %(message)s")
+
+        ch = logging.StreamHandler()
+        ch.setFormatter(fmt)
+        _handlers.append(ch)
+
+        fh = CompressedRotatingFileHandler(
+            os.path.join(LOG_DIR, LOG_FILE),
+            max_bytes=LOG_MAX_BYTES,
+            max_total_bytes=LOG_MAX_TOTAL_BYTES,
+            max_age_days=LOG_MAX_AGE_DAYS,
+        )
+        fh.setFormatter(fmt)
+        _handlers.append(fh)
+    return _handlers
+
+
 def get_logger(name=__name__, level=None):
     if level is None:
         level = os.getenv("LOG_LEVEL", "INFO")
@@ -15,16 +176,14 @@ def get_logger(name=__name__, level=None):
 
     numeric_level = getattr(logging, level.upper(), logging.INFO)
     logger.setLevel(numeric_level)
-    fmt = logging.Formatter("%(asctime)s — %(levelname)s — %(name)s — %(message)s")
+    logger.addFilter(_repeat_filter)
+    for handler in _shared_handlers():
+        logger.addHandler(handler)
 
-    ch = logging.StreamHandler()
-    ch.setFormatter(fmt)
-    logger.addHandler(ch)
+    return logger
 
-    fh = RotatingFileHandler(
-        os.path.join(LOG_DIR, "bot.log"), maxBytes=5 * 1024 * 1024, backupCount=5
-    )
-    fh.setFormatter(fmt)
-    logger.addHandler(fh)
 
-    return logger
+def flush_logs():
+    """Push buffered records out; called on shutdown before the process exits."""
+    for handler in _handlers:
+        handler.flush()
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from db import notify
+from utils.cache import settings_cache, leaderboard_cache, user_stats_cache
+
+GUILD = 1
+USER = 2
+
+
+@pytest.fixture(autouse=True)
+def warm_caches():
+    settings_cache.clear()
+    leaderboard_cache.clear()
+    user_stats_cache.clear()
+    settings_cache.set(GUILD, {"guild_id": GUILD})
+    leaderboard_cache.set(GUILD, ["row"])
+    user_stats_cache.set(GUILD, USER, {"total": 1.0})
+    yield
+    settings_cache.clear()
+    leaderboard_cache.clear()
+    user_stats_cache.clear()
+
+
+def _cached():
+    return (
+        settings_cache.get(GUILD) is not None,
+        leaderboard_cache.get(GUILD) is not None,
+        user_stats_cache.get(GUILD, USER) is not None,
+    )
+
+
+def _flip(op, **fields):
+    return {"table": "flips", "op": op, "guild_id": GUILD, "user_id": USER, **fields}
+
+
+def _user(op, **fields):
+    return {"table": "users", "op": op, "guild_id": GUILD, "user_id": USER, **fields}
+
+
+@pytest.mark.parametrize(
+    "event, moves",
+    [
+        (_flip("INSERT", status="pending", profit=5), False),
+        (_flip("UPDATE", status="pending", profit=5, old_status="pending", old_profit=5), False),
+        (_flip("UPDATE", status="approved", profit=5, old_status="pending", old_profit=5), True),
+        (_flip("UPDATE", status="approved", profit=7, old_status="approved", old_profit=5), True),
+        (_flip("UPDATE", status="approved"), True),  # trigger without old_*
+        (_flip("DELETE", status="approved", profit=5), True),
+        (_user("UPDATE", total_profit=10, old_total_profit=10), False),
+        (_user("UPDATE", total_profit=12, old_total_profit=10), True),
+        (_user("UPDATE", total_profit=10), True),  # trigger without old_*
+        (_user("INSERT", total_profit=0), True),
+        (_user("DELETE", total_profit=10), True),
+    ],
+)
+def test_moves_totals(event, moves):
+    assert notify._moves_totals(event) is moves
+
+
+def test_dispatch_settings_change_only_drops_settings():
+    notify.dispatch({"table": "guild_settings", "op": "UPDATE", "guild_id": GUILD})
+    assert _cached() == (False, True, True)
+
+
+def test_dispatch_username_upsert_keeps_leaderboard():
+    notify.dispatch(_user("UPDATE", total_profit=10, old_total_profit=10))
+    assert _cached() == (True, True, True)
+
+
+def test_dispatch_approval_drops_leaderboard_and_stats():
+    notify.dispatch(
+        _flip("UPDATE", status="approved", profit=5, old_status="pending", old_profit=5)
+    )
+    assert _cached() == (True, False, False)
+
+
+def test_dispatch_ignores_unknown_table():
+    notify.dispatch({"table": "audit", "op": "INSERT", "guild_id": GUILD})
+    assert _cached() == (True, True, True)
+
+
+def test_local_bus_delivers_on_loop(monkeypatch):
+    monkeypatch.setattr(notify, "DATABASE_URL", None)
+
+    async def publish_and_wait():
+        bus = notify.start_listener(asyncio.get_running_loop())
+        assert isinstance(bus, notify.LocalNotifyBus)
+        bus.publish(_user("UPDATE", total_profit=12, old_total_profit=10))
+        # delivery is scheduled on the loop, like a NOTIFY from the listener thread
+        assert _cached() == (True, True, True)
+        await asyncio.sleep(0)
+        bus.stop()
+        return bus.received
+
+    assert asyncio.run(publish_and_wait()) == 1
+    assert _cached() == (True, False, False)
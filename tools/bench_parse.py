@@ -0,0 +1,95 @@
+"""
+Micro-benchmark for the flip modal's amount parser.
+
+Checks `utils.money.parse_money` against known inputs first, then times it on
+plain inputs (the fast path), on shorthand and locale-formatted inputs, and on
+invalid ones, next to a bare `float()` for scale.
+
+    python -m tools.bench_parse
+    python -m tools.bench_parse --number 500000 --repeat 7
+"""
+
+import argparse
+import timeit
+from utils.money import parse_money, MoneyError
+
+CASES = {
+    "plain": ["250", "19.99", "0", "1200", "7.5"],
+    "formatted": ["$1,234.56", "1.234,56", "12,50", "1.2k", "1.999k", "3 m", "250 €"],
+    "invalid": ["1.2x", "12,345,6", "-5", "abc", "1.234567", "0,001"],
+}
+
+# input -> cents, or None when it must be rejected
+EXPECTED = {
+    "250": 25000,
+    "19.9": 1990,
+    "$1,234.56": 123456,
+    "1.234,56": 123456,
+    "1 234,56": 123456,
+    "12,50": 1250,
+    "1,500": 150000,
+    "1.500": 150000,
+    "1.2k": 120000,
+    "1.999k": 199900,
+    "2.500k": 250000,
+    "1,5k": 150000,
+    "3 m": 300000000,
+    "0,001": None,
+    "1234,567": None,
+    "1,234,56": None,
+    "1,500,000k": None,
+    "-5": None,
+    "1e5": None,
+}
+
+
+def check():
+    """Names of the EXPECTED inputs the parser gets wrong."""
+    wrong = []
+    for value, cents in EXPECTED.items():
+        try:
+            got = parse_money(value)
+        except MoneyError:
+            got = None
+        if got != cents:
+            wrong.append(f"{value!r}: got {got}, expected {cents}")
+    return wrong
+
+
+def _parse_all(values):
+    for value in values:
+        try:
+            parse_money(value)
+        except MoneyError:
+            pass
+
+
+def _float_all(values):
+    for value in values:
+        float(value)
+
+
+def bench(fn, values, number: int, repeat: int) -> float:
+    """Best time per call in nanoseconds."""
+    best = min(timeit.repeat(lambda: fn(values), number=number, repeat=repeat))
+    return best / (number * len(values)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    wrong = check()
+    if wrong:
+        raise SystemExit("parse_money is wrong for:\n  " + "\n  ".join(wrong))
+    print(f"{len(EXPECTED)} parser checks passed\n")
+    print(f"{'inputs':<12} {'ns/call':>10}")
+    print(f"{'float()':<12} {bench(_float_all, CASES['plain'], args.number, args.repeat):>10.0f}")
+    for name, values in CASES.items():
+        print(f"{name:<12} {bench(_parse_all, values, args.number, args.repeat):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
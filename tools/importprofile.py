@@ -0,0 +1,55 @@
+"""
+Show which imports make bot startup slow.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+prints the modules with the highest cumulative import time.
+
+    python -m tools.importprofile
+    python -m tools.importprofile --module cogs.flip --top 30
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile(module: str):
+    """Return [(cumulative_us, self_us, name)] for one import of `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise SystemExit(f"import {module} failed")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="bot")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = profile(args.module)
+    total = max((r[0] for r in rows), default=0)
+    print(f"import {args.module}: {total / 1e6:.3f}s cumulative\n")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative, own, name in sorted(rows, reverse=True)[: args.top]:
+        print(f"{cumulative / 1e3:>10.1f}ms {own / 1e3:>8.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
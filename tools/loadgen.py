@@ -0,0 +1,680 @@
+"""
+Synthetic load generator for the flip workflow.
+
+Drives the real cog code paths (FlipModal.on_submit, ApproveRejectView.approve /
+reject, AdminCog.send_leaderboard_summary) for N guilds and M users per guild,
+with an in-memory stand-in for Supabase and fake Discord channels that enforce
+Discord-like per-channel rate limits. The traffic shape is drawn from a seeded
+RNG, so two runs with the same arguments submit the same flips in the same order.
+
+    python -m tools.loadgen --guilds 50 --users 20 --submit-rate 20 --duration 60
+    python -m tools.loadgen --seed 7 --db-latency-ms 40 --json results.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.pop("DATABASE_URL", None)
+os.environ["OUTBOX_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="loadgen-"), "outbox.sqlite3"
+)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# every error should reach ErrorCounter, not just the first of a burst
+os.environ["LOG_REPEAT_WINDOW"] = "0"
+
+import discord  # noqa: E402
+
+ITEMS = [
+    "1997 Mercury 9.9",
+    "Evinrude 15hp",
+    "Johnson 25",
+    "Yamaha 40hp",
+    "Tohatsu 6hp",
+    "Honda BF50",
+    "Suzuki DF90",
+    "Jon boat 14ft",
+    "Bass Tracker 17",
+    "Trailer (single axle)",
+]
+
+
+# ---- In-memory Supabase stand-in ----
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+_OPS = {
+    "eq": lambda v, x: v == x,
+    "neq": lambda v, x: v != x,
+    "gt": lambda v, x: v is not None and v > x,
+    "gte": lambda v, x: v is not None and v >= x,
+    "lt": lambda v, x: v is not None and v < x,
+    "lte": lambda v, x: v is not None and v <= x,
+}
+
+
+def _split_top(text):
+    """Split on commas outside parentheses and double quotes."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _parse_logic(kind, text):
+    tests = []
+    for part in _split_top(text):
+        if part.startswith(("and(", "or(")):
+            inner_kind, inner = part.split("(", 1)
+            tests.append(_parse_logic(inner_kind, inner[:-1]))
+            continue
+        col, op, value = part.split(".", 2)
+        tests.append(_compare(col, _OPS[op], value.strip('"')))
+    combine = all if kind == "and" else any
+    return lambda r: combine(t(r) for t in tests)
+
+
+def _compare(col, op, raw):
+    def test(r):
+        v = r.get(col)
+        # filter values arrive as text; compare numbers as numbers
+        return op(v, type(v)(raw) if isinstance(v, (int, float)) else raw)
+
+    return test
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.row_range = None
+        self.count_mode = None
+        self.single_row = False
+        self.ignore_duplicates = False
+
+    def select(self, columns="*", count=None):
+        self.op = "select"
+        self.count_mode = count
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def update(self, changes):
+        self.op, self.payload = "update", changes
+        return self
+
+    def upsert(self, rows, ignore_duplicates=False, **kwargs):
+        self.op, self.payload = "upsert", rows
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def _filter(self, col, test):
+        self.filters.append(lambda r: test(r.get(col)))
+        return self
+
+    def eq(self, col, val):
+        return self._filter(col, lambda v: v == val)
+
+    def neq(self, col, val):
+        return self._filter(col, lambda v: v != val)
+
+    def gt(self, col, val):
+        return self._filter(col, lambda v: v is not None and v > val)
+
+    def gte(self, col, val):
+        return self._filter(col, lambda v: v is not None and v >= val)
+
+    def lt(self, col, val):
+        return self._filter(col, lambda v: v is not None and v < val)
+
+    def lte(self, col, val):
+        return self._filter(col, lambda v: v is not None and v <= val)
+
+    def in_(self, col, values):
+        values = list(values)
+        return self._filter(col, lambda v: v in values)
+
+    def or_(self, filters):
+        """PostgREST logic tree, e.g. 'a.gt.1,and(a.eq.1,b.gt."x")'."""
+        test = _parse_logic("or", filters)
+        self.filters.append(test)
+        return self
+
+    def order(self, col, desc=False):
+        self.orders.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self.row_range = (0, n - 1)
+        return self
+
+    def range(self, start, end):
+        self.row_range = (start, end)
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def execute(self):
+        return self.db.execute(self)
+
+
+class FakeRpc:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self):
+        self.db.simulate_latency()
+        return FakeResponse([datetime.now(timezone.utc).isoformat()])
+
+
+class FakeSupabase:
+    PRIMARY_KEYS = {
+        "flips": ("id",),
+        "users": ("id", "guild_id"),
+        "guild_settings": ("guild_id",),
+    }
+
+    def __init__(self, latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.tables = {"flips": [], "users": [], "guild_settings": []}
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self)
+
+    def simulate_latency(self):
+        if self.latency:
+            # +/- 50% so calls don't complete in lockstep
+            time.sleep(self.latency * self._rng.uniform(0.5, 1.5))
+
+    def execute(self, q: FakeQuery):
+        self.simulate_latency()
+        with self._lock:
+            self.calls += 1
+            rows = self.tables.setdefault(q.table, [])
+            if q.op in ("insert", "upsert"):
+                return FakeResponse(self._write(q, rows))
+            matches = [r for r in rows if all(f(r) for f in q.filters)]
+            if q.op == "update":
+                for r in matches:
+                    r.update(q.payload)
+                return FakeResponse([dict(r) for r in matches])
+            if q.op == "delete":
+                self.tables[q.table] = [r for r in rows if r not in matches]
+                return FakeResponse([dict(r) for r in matches])
+            for col, desc in reversed(q.orders):
+                matches.sort(
+                    key=lambda r: (r.get(col) is None, r.get(col) or 0), reverse=desc
+                )
+            count = len(matches) if q.count_mode else None
+            if q.row_range:
+                matches = matches[q.row_range[0] : q.row_range[1] + 1]
+            data = [dict(r) for r in matches]
+            if q.single_row:
+                data = data[0] if data else None
+            return FakeResponse(data, count)
+
+    def _write(self, q, rows):
+        payload = q.payload if isinstance(q.payload, list) else [q.payload]
+        keys = self.PRIMARY_KEYS.get(q.table, ("id",))
+        written = []
+        now = datetime.now(timezone.utc).isoformat()
+        for item in payload:
+            item = dict(item)
+            if q.table == "flips":
+                item.setdefault("id", str(uuid.uuid4()))
+                item.setdefault("created_at", now)
+                item.setdefault("submitted_at", now)
+            existing = None
+            if q.op == "upsert":
+                existing = next(
+                    (r for r in rows if all(r.get(k) == item.get(k) for k in keys)),
+                    None,
+                )
+            if existing is not None:
+                if q.ignore_duplicates:
+                    continue
+                existing.update(item)
+                written.append(dict(existing))
+            else:
+                rows.append(item)
+                written.append(dict(item))
+        return written
+
+
+# ---- Fake Discord transport ----
+class ErrorCounter(logging.Handler):
+    """Handlers swallow their exceptions and log them; count those as errors."""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.counts = {}
+        self.rate_limit_hits = 0
+        self.rate_limit_wait = 0.0
+        self.discord_calls = 0
+        self.errors = 0
+        self.summary_edits_skipped = 0
+        self.pending_samples = []
+
+    def record(self, op, seconds):
+        self.latencies.setdefault(op, []).append(seconds)
+        self.counts[op] = self.counts.get(op, 0) + 1
+
+
+class RateLimiter:
+    """Discord-like buckets: 5 messages / 5s per channel plus 50 req/s globally."""
+
+    def __init__(self, stats: Stats):
+        self.stats = stats
+        self.buckets = {}
+
+    async def acquire(self, key, limit, per):
+        limited = False
+        while True:
+            now = time.monotonic()
+            window = [t for t in self.buckets.get(key, []) if now - t < per]
+            if len(window) < limit:
+                window.append(now)
+                self.buckets[key] = window
+                return
+            retry_after = per - (now - window[0])
+            self.buckets[key] = window
+            if not limited:
+                limited = True
+                self.stats.rate_limit_hits += 1
+            self.stats.rate_limit_wait += retry_after
+            # discord.py would sleep on the 429's retry_after the same way
+            await asyncio.sleep(retry_after)
+
+    async def call(self, channel_id, route):
+        self.stats.discord_calls += 1
+        await self.acquire("global", 50, 1.0)
+        await self.acquire((channel_id, route), 5, 5.0)
+
+
+_ids = itertools.count(10**17)
+
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None, embeds=None, view=None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.embeds = embeds or ([embed] if embed else [])
+        self.view = view
+
+    @property
+    def jump_url(self):
+        return f"https://discord.com/channels/{self.channel.guild.id}/{self.channel.id}/{self.id}"
+
+    async def edit(self, content=None, embed=None, embeds=None, view=None, **kwargs):
+        await self.channel.limiter.call(self.channel.id, "edit")
+        if content is not None:
+            self.content = content
+        if embeds is not None:
+            self.embeds = embeds
+        elif embed is not None:
+            self.embeds = [embed]
+        if "view" in kwargs or view is None:
+            self.view = view
+        return self
+
+
+class FakeChannel:
+    def __init__(self, guild, name, limiter):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = name
+        self.limiter = limiter
+        self.messages = {}
+        self.mention = f"<#{self.id}>"
+
+    async def send(self, content=None, embed=None, embeds=None, view=None, **kwargs):
+        await self.limiter.call(self.id, "send")
+        msg = FakeMessage(self, content, embed, embeds, view)
+        self.messages[msg.id] = msg
+        return msg
+
+    async def fetch_message(self, message_id):
+        await self.limiter.call(self.id, "fetch")
+        msg = self.messages.get(int(message_id))
+        if msg is None:
+            raise discord.NotFound(FakeHTTPResponse(404), "Unknown Message")
+        return msg
+
+    def get_partial_message(self, message_id):
+        return FakePartialMessage(self, int(message_id))
+
+
+class FakePartialMessage:
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, **kwargs):
+        msg = self.channel.messages.get(self.id)
+        if msg is None:
+            await self.channel.limiter.call(self.channel.id, "edit")
+            raise discord.NotFound(FakeHTTPResponse(404), "Unknown Message")
+        return await msg.edit(**kwargs)
+
+
+class FakeHTTPResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = "Not Found"
+
+
+class FakePermissions:
+    def __init__(self, manage_guild):
+        self.manage_guild = manage_guild
+
+
+class FakeMember:
+    def __init__(self, guild, user_id, moderator=False):
+        self.id = user_id
+        self.name = f"user{user_id % 100000}"
+        self.mention = f"<@{user_id}>"
+        self.guild_permissions = FakePermissions(moderator)
+
+
+class FakeGuild:
+    def __init__(self, guild_id, users, limiter):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+        self.member_flips = FakeChannel(self, "member-flips", limiter)
+        self.leaderboard = FakeChannel(self, "leaderboard", limiter)
+        self.logs = FakeChannel(self, "flip-logs", limiter)
+        self.text_channels = [self.member_flips, self.leaderboard, self.logs]
+        self.members = {u: FakeMember(self, u) for u in users}
+        self.moderator = FakeMember(self, next(_ids), moderator=True)
+        self.owner = self.moderator
+
+    def get_channel(self, channel_id):
+        return next((c for c in self.text_channels if c.id == channel_id), None)
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+
+class FakeResponseState:
+    def __init__(self):
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, **kwargs):
+        self.done = True
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+
+    async def send_modal(self, modal):
+        self.done = True
+
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        return None
+
+
+class FakeClient:
+    def __init__(self):
+        self.cogs = {}
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+
+class FakeInteraction:
+    def __init__(self, client, guild, user, channel, message=None):
+        self.id = next(_ids)
+        self.client = client
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = channel
+        self.message = message
+        self.response = FakeResponseState()
+        self.followup = FakeFollowup()
+
+
+# ---- Traffic driver ----
+async def run(args):
+    import db.supabase as dbmod
+    from cogs.flip import FlipModal
+    from utils.pending import pending_approvals
+    from cogs.admin import AdminCog
+
+    rng = random.Random(args.seed)
+    stats = Stats()
+    error_counter = ErrorCounter()
+    logging.getLogger().addHandler(error_counter)
+    limiter = RateLimiter(stats)
+    fake_db = FakeSupabase(latency=args.db_latency_ms / 1000.0, seed=args.seed)
+    dbmod.supabase = fake_db
+
+    client = FakeClient()
+    client.cogs["AdminCog"] = AdminCog(client)
+
+    guilds = []
+    for g in range(args.guilds):
+        users = [next(_ids) for _ in range(args.users)]
+        guild = FakeGuild(next(_ids), users, limiter)
+        fake_db.tables["guild_settings"].append(
+            {
+                "guild_id": guild.id,
+                "member_flips_channel_id": guild.member_flips.id,
+                "leaderboard_channel_id": guild.leaderboard.id,
+                "log_channel_id": guild.logs.id,
+            }
+        )
+        guilds.append(guild)
+
+    pending = []  # (guild, message carrying the approval view)
+    claimed = set()
+    in_flight = set()
+
+    async def timed(op, coro):
+        start = time.perf_counter()
+        try:
+            await coro
+        except Exception:
+            stats.errors += 1
+        stats.record(op, time.perf_counter() - start)
+
+    async def submit(guild, user_id, item, prices):
+        modal = FlipModal(member_channel_id=guild.member_flips.id)
+        modal.item._value = item
+        modal.purchase_price._value, modal.parts_price._value, modal.sales_price._value = prices
+        member = guild.members[user_id]
+        interaction = FakeInteraction(client, guild, member, guild.member_flips)
+        await timed("submit", modal.on_submit(interaction))
+        # the modal posted the flip with its approval view; pick it up like a moderator would
+        for msg in reversed(list(guild.member_flips.messages.values())):
+            entry = pending_approvals.get(msg.id)
+            if (
+                entry is not None
+                and msg.id not in claimed
+                and entry.user_id == user_id
+                and entry.item == item
+            ):
+                claimed.add(msg.id)
+                pending.append((guild, msg))
+                return
+
+    async def handle(guild, msg, approve):
+        view = msg.view
+        interaction = FakeInteraction(
+            client, guild, guild.moderator, guild.member_flips, message=msg
+        )
+        button = view.approve if approve else view.reject
+        await timed("approve" if approve else "reject", button.callback(interaction))
+
+    def spawn(coro):
+        task = asyncio.create_task(coro)
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    start = time.monotonic()
+    next_sample = start
+    submit_interval = 1.0 / args.submit_rate if args.submit_rate else None
+    handle_interval = 1.0 / args.handle_rate if args.handle_rate else None
+    next_submit = start
+    next_handle = start + args.review_delay
+
+    while time.monotonic() - start < args.duration:
+        now = time.monotonic()
+        if submit_interval and now >= next_submit:
+            guild = rng.choice(guilds)
+            user_id = rng.choice(list(guild.members))
+            purchase = rng.randint(50, 5000)
+            parts = rng.randint(0, 800)
+            sale = purchase + parts + rng.randint(-300, 2500)
+            item = rng.choice(ITEMS)
+            spawn(submit(guild, user_id, item, (str(purchase), str(parts), str(sale))))
+            next_submit += rng.expovariate(1.0 / submit_interval)
+        if handle_interval and now >= next_handle and pending:
+            guild, msg = pending.pop(rng.randrange(len(pending)))
+            spawn(handle(guild, msg, rng.random() < args.approve_ratio))
+            next_handle += rng.expovariate(1.0 / handle_interval)
+        elif handle_interval and now >= next_handle:
+            next_handle = now + handle_interval
+        if now >= next_sample:
+            stats.pending_samples.append(
+                (round(now - start, 1), len(pending), len(in_flight))
+            )
+            next_sample += 1.0
+        await asyncio.sleep(0.001)
+
+    # let in-flight handlers finish so their latencies are counted
+    if in_flight:
+        await asyncio.wait(set(in_flight), timeout=args.drain_timeout)
+    # stands in for FlipCog's flush loop, which isn't running here
+    from db import writebehind
+
+    await asyncio.to_thread(writebehind.flush)
+    elapsed = time.monotonic() - start
+    stats.errors += error_counter.count
+    stats.summary_edits_skipped = client.cogs["AdminCog"].summary_edits_skipped
+    return summarize(args, stats, fake_db, elapsed)
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return round(values[idx] * 1000, 1)
+
+
+def summarize(args, stats, fake_db, elapsed):
+    ops = {}
+    for op, values in stats.latencies.items():
+        ops[op] = {
+            "count": len(values),
+            "throughput_per_s": round(len(values) / elapsed, 2),
+            "p50_ms": _percentile(values, 50),
+            "p95_ms": _percentile(values, 95),
+            "p99_ms": _percentile(values, 99),
+            "max_ms": _percentile(values, 100),
+        }
+    peak_pending = max((s[1] for s in stats.pending_samples), default=0)
+    from utils.pending import pending_approvals
+    from db import writebehind
+
+    return {
+        "config": vars(args),
+        "pending_registry": pending_approvals.stats(),
+        "elapsed_s": round(elapsed, 2),
+        "operations": ops,
+        "errors": stats.errors,
+        "db_calls": fake_db.calls,
+        "discord_calls": stats.discord_calls,
+        "rate_limit_hits": stats.rate_limit_hits,
+        "rate_limit_wait_s": round(stats.rate_limit_wait, 2),
+        "leaderboard_edits_skipped": stats.summary_edits_skipped,
+        "write_behind": dict(writebehind.stats),
+        "peak_pending": peak_pending,
+        "final_pending": stats.pending_samples[-1][1] if stats.pending_samples else 0,
+        "queue_samples": stats.pending_samples,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--users", type=int, default=20, help="users per guild")
+    parser.add_argument("--submit-rate", type=float, default=5.0, help="submissions/s")
+    parser.add_argument("--handle-rate", type=float, default=4.0, help="reviews/s")
+    parser.add_argument("--approve-ratio", type=float, default=0.8)
+    parser.add_argument("--review-delay", type=float, default=2.0, help="seconds before moderators start")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the full results to this file")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    summary = {k: v for k, v in results.items() if k != "queue_samples"}
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
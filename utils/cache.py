@@ -0,0 +1,155 @@
+import itertools
+import os
+import threading
+import time
+from logger import get_logger
+
+logger = get_logger("cache")
+
+_shard_count = int(os.getenv("SHARD_COUNT") or 1)
+
+
+def set_shard_count(count: int):
+    """Called once the bot knows its real shard count; re-partitions existing caches."""
+    global _shard_count
+    count = max(1, int(count or 1))
+    if count == _shard_count:
+        return
+    _shard_count = count
+    for cache in GuildCache.instances:
+        cache.clear()
+    logger.info("Guild caches partitioned for %s shard(s)", count)
+
+
+def shard_for(guild_id: int) -> int:
+    # Discord's documented shard routing formula
+    return (int(guild_id) >> 22) % _shard_count
+
+
+class GuildCache:
+    """
+    Small TTL cache keyed by guild id, partitioned by shard so a shard's entries
+    can be dropped together (e.g. when its gateway session is re-established and
+    invalidations may have been missed). Safe to use from worker threads.
+    """
+
+    instances = []
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._partitions = {}
+        # every set() gets a new stamp, so an entry's stamp identifies that exact value
+        self._stamps = itertools.count(1)
+        self._lock = threading.Lock()
+        GuildCache.instances.append(self)
+
+    def get(self, guild_id: int, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._partitions.get(shard_for(guild_id), {}).get(int(guild_id))
+            if entry is None or entry[0] < now:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[1]
+
+    def set(self, guild_id: int, value):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            partition = self._partitions.setdefault(shard_for(guild_id), {})
+            partition[int(guild_id)] = (expires, value, next(self._stamps))
+
+    def version(self, guild_id: int):
+        """
+        Stamp of the guild's live entry, or None when there is none. It changes
+        whenever the entry is replaced, invalidated or expires, so anything derived
+        from the cached value can be memoized against it for exactly its lifetime.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._partitions.get(shard_for(guild_id), {}).get(int(guild_id))
+            return entry[2] if entry is not None and entry[0] >= now else None
+
+    def invalidate(self, guild_id: int):
+        with self._lock:
+            self._partitions.get(shard_for(guild_id), {}).pop(int(guild_id), None)
+
+    def clear_shard(self, shard_id: int):
+        with self._lock:
+            self._partitions.pop(shard_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = {shard: len(p) for shard, p in self._partitions.items()}
+        return {
+            "entries": sum(sizes.values()),
+            "per_shard": sizes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class UserCache(GuildCache):
+    """GuildCache variant holding one entry per (guild, user), in the guild's shard partition."""
+
+    def get(self, guild_id: int, user_id: int, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._partitions.get(shard_for(guild_id), {}).get(
+                (int(guild_id), int(user_id))
+            )
+            if entry is None or entry[0] < now:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[1]
+
+    def set(self, guild_id: int, user_id: int, value):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            partition = self._partitions.setdefault(shard_for(guild_id), {})
+            partition[(int(guild_id), int(user_id))] = (expires, value, next(self._stamps))
+
+    def update(self, guild_id: int, user_id: int, fn):
+        """Apply `fn(value)` to a live entry in place; does nothing if it isn't cached."""
+        with self._lock:
+            entry = self._partitions.get(shard_for(guild_id), {}).get(
+                (int(guild_id), int(user_id))
+            )
+            if entry is not None and entry[0] >= time.monotonic():
+                fn(entry[1])
+
+    def invalidate(self, guild_id: int, user_id: int = None):
+        """Drop one user's entry, or every user of the guild when user_id is None."""
+        with self._lock:
+            partition = self._partitions.get(shard_for(guild_id), {})
+            if user_id is not None:
+                partition.pop((int(guild_id), int(user_id)), None)
+                return
+            for key in [k for k in partition if k[0] == int(guild_id)]:
+                del partition[key]
+
+
+def clear_shard(shard_id: int):
+    for cache in GuildCache.instances:
+        cache.clear_shard(shard_id)
+
+
+settings_cache = GuildCache("settings", ttl=float(os.getenv("SETTINGS_CACHE_TTL", "300")))
+leaderboard_cache = GuildCache(
+    "leaderboard", ttl=float(os.getenv("LEADERBOARD_CACHE_TTL", "60"))
+)
+# rendered leaderboard pages, tagged with the leaderboard_cache version they were built from
+leaderboard_render_cache = GuildCache(
+    "leaderboard_render", ttl=float(os.getenv("LEADERBOARD_RENDER_TTL", "600"))
+)
+user_stats_cache = UserCache(
+    "user_stats", ttl=float(os.getenv("USER_STATS_CACHE_TTL", "300"))
+)
@@ -0,0 +1,109 @@
+"""
+Incremental slash-command sync.
+
+`bot.tree.sync()` bulk-overwrites every command on each call. `sync_commands()`
+instead fetches what Discord currently has, compares it with the local tree and
+only creates, updates or deletes the commands that differ, so an unchanged tree
+costs a single GET. With a guild, global commands are copied to that guild
+first, which makes changes visible there immediately (global commands can take
+a while to propagate), e.g. for test servers.
+"""
+
+import os
+from logger import get_logger
+
+logger = get_logger("command_sync")
+
+# guilds that get the global commands copied in on startup (comma-separated ids)
+SYNC_GUILD_IDS = [
+    int(g) for g in os.getenv("SYNC_GUILD_IDS", "").replace(" ", "").split(",") if g
+]
+
+# Discord fills these in (or omits them for guild commands); only compare when both sides have them
+_SERVER_DEFAULTED = {"dm_permission", "contexts", "integration_types"}
+_IGNORED = {"id", "application_id", "guild_id", "version"}
+
+
+def _normalize(value):
+    """Drop unset/falsy fields so local payloads and Discord's echo compare equal."""
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            if key in _IGNORED:
+                continue
+            item = _normalize(item)
+            if item in (None, False, [], {}):
+                continue
+            if key == "default_member_permissions":
+                item = str(item)
+            out[key] = item
+        return out
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _differs(local: dict, remote: dict) -> bool:
+    local, remote = _normalize(local), _normalize(remote)
+    for key in set(local) | set(remote):
+        if key in _SERVER_DEFAULTED and (key not in local or key not in remote):
+            continue
+        if local.get(key) != remote.get(key):
+            return True
+    return False
+
+
+async def sync_commands(bot, guild=None, copy_global: bool = True) -> dict:
+    """
+    Push only changed commands for `guild` (or the global scope when None).
+    Returns counts of created / updated / deleted / unchanged commands.
+    """
+    tree = bot.tree
+    if guild is not None and copy_global:
+        tree.copy_global_to(guild=guild)
+
+    local = {
+        (cmd.name, cmd.to_dict(tree)["type"]): cmd.to_dict(tree)
+        for cmd in tree.get_commands(guild=guild)
+    }
+    app_id = bot.application_id
+    if guild is not None:
+        remote_list = await bot.http.get_guild_commands(app_id, guild.id)
+    else:
+        remote_list = await bot.http.get_global_commands(app_id)
+    remote = {(cmd["name"], cmd.get("type", 1)): cmd for cmd in remote_list}
+
+    result = {"created": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    for key, payload in local.items():
+        current = remote.get(key)
+        if current is not None and not _differs(payload, current):
+            result["unchanged"] += 1
+            continue
+        if guild is not None:
+            await bot.http.upsert_guild_command(app_id, guild.id, payload)
+        else:
+            await bot.http.upsert_global_command(app_id, payload)
+        result["created" if current is None else "updated"] += 1
+        logger.info(
+            "%s command /%s in %s",
+            "Created" if current is None else "Updated",
+            key[0],
+            f"guild {guild.id}" if guild is not None else "global scope",
+        )
+
+    for key, current in remote.items():
+        if key in local:
+            continue
+        if guild is not None:
+            await bot.http.delete_guild_command(app_id, guild.id, current["id"])
+        else:
+            await bot.http.delete_global_command(app_id, current["id"])
+        result["deleted"] += 1
+        logger.info("Deleted stale command /%s", key[0])
+
+    return result
+
+
+def clear_guild_commands(bot, guild):
+    """Drop the local guild-scoped copies; the next sync_commands() deletes them remotely."""
+    bot.tree.clear_commands(guild=guild)
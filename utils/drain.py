@@ -0,0 +1,118 @@
+"""
+Drain mode for lossless restarts.
+
+On SIGTERM / SIGINT the bot stops taking new interactions (they get a short
+"restarting" reply), waits for the handlers already running, gives every cog
+with a `drain()` coroutine the chance to finish its background work, and only
+then closes. Everything together is bounded by DRAIN_TIMEOUT; a second signal
+skips the wait.
+
+Interactions are admitted through `drainer.admit()`, called from the command
+tree's and each view's / modal's `interaction_check`. Those checks run inside
+the task that goes on to run the handler, so that task is what gets tracked.
+"""
+
+import asyncio
+import os
+import signal
+import time
+import discord
+from logger import get_logger, flush_logs
+
+logger = get_logger("drain")
+
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "20"))
+DRAIN_MESSAGE = "🔄 The bot is restarting — please try again in a minute."
+
+
+class Drainer:
+    def __init__(self):
+        self.draining = False
+        self.refused = 0
+        self._inflight = set()
+        self._task = None
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def admit(self, interaction: discord.Interaction) -> bool:
+        """True if the interaction may run; otherwise it has been answered already."""
+        if self.draining:
+            self.refused += 1
+            await self._refuse(interaction)
+            return False
+        task = asyncio.current_task()
+        if task is not None and task not in self._inflight:
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+        return True
+
+    @staticmethod
+    async def _refuse(interaction: discord.Interaction):
+        try:
+            if interaction.type is discord.InteractionType.autocomplete:
+                await interaction.response.autocomplete([])
+            elif not interaction.response.is_done():
+                await interaction.response.send_message(DRAIN_MESSAGE, ephemeral=True)
+        except Exception as e:
+            logger.debug("Could not answer interaction while draining: %s", e)
+
+    def install(self, bot, loop: asyncio.AbstractEventLoop):
+        """Route SIGTERM and SIGINT to `drain()`; a second signal closes at once."""
+
+        def on_signal(signum):
+            if self._task is None:
+                logger.info("Received %s, draining", signal.Signals(signum).name)
+                self._task = loop.create_task(self.drain(bot), name="drain")
+            else:
+                logger.warning("Second signal, closing without waiting")
+                loop.create_task(bot.close())
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(signum, on_signal, signum)
+            except (NotImplementedError, RuntimeError):
+                # Windows, or not the main thread: keep the default handling
+                logger.info("Signal handlers unavailable; drain on shutdown disabled")
+                return
+
+    async def drain(self, bot, timeout: float = DRAIN_TIMEOUT):
+        if self.draining:
+            return
+        self.draining = True
+        started = time.monotonic()
+        deadline = started + timeout
+
+        if self._inflight:
+            logger.info("Waiting for %s in-flight interaction(s)", len(self._inflight))
+            _, pending = await asyncio.wait(set(self._inflight), timeout=timeout)
+            if pending:
+                logger.warning(
+                    "%s interaction(s) still running after %ss; closing anyway",
+                    len(pending),
+                    timeout,
+                )
+
+        for name, cog in list(bot.cogs.items()):
+            cog_drain = getattr(cog, "drain", None)
+            remaining = deadline - time.monotonic()
+            if cog_drain is None or remaining <= 0:
+                continue
+            try:
+                await asyncio.wait_for(cog_drain(), timeout=remaining)
+            except asyncio.TimeoutError:
+                logger.warning("%s did not finish draining in time", name)
+            except Exception:
+                logger.exception("%s failed while draining", name)
+
+        logger.info(
+            "Drained in %.1fs (%s interaction(s) turned away); closing",
+            time.monotonic() - started,
+            self.refused,
+        )
+        # unloading the cogs runs their cog_unload (final write-behind flush)
+        await bot.close()
+        flush_logs()
+
+
+drainer = Drainer()
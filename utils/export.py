@@ -0,0 +1,117 @@
+import csv
+import gzip
+import os
+import tempfile
+from logger import get_logger
+
+logger = get_logger("export")
+
+EXPORT_COLUMNS = [
+    "id",
+    "guild_id",
+    "user_id",
+    "item",
+    "purchase_price",
+    "parts_price",
+    "total_cost",
+    "sales_price",
+    "profit",
+    "status",
+    "submitted_at",
+    "handled_by",
+    "handled_at",
+    "member_message_id",
+    "photo_url",
+    "notes",
+]
+
+# rows buffered per Parquet row group; keeps memory bounded for large exports
+PARQUET_BATCH_SIZE = 5000
+
+
+def write_csv_gz(rows, path: str) -> int:
+    """Write rows (any iterable of dicts) to a gzip-compressed CSV. Returns row count."""
+    count = 0
+    with gzip.open(path, "wt", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_parquet(rows, path: str) -> int:
+    """Write rows to a Parquet file in row groups. Requires pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires the 'pyarrow' package.")
+
+    schema = pa.schema(
+        [
+            ("id", pa.string()),
+            ("guild_id", pa.int64()),
+            ("user_id", pa.int64()),
+            ("item", pa.string()),
+            ("purchase_price", pa.float64()),
+            ("parts_price", pa.float64()),
+            ("total_cost", pa.float64()),
+            ("sales_price", pa.float64()),
+            ("profit", pa.float64()),
+            ("status", pa.string()),
+            ("submitted_at", pa.string()),
+            ("handled_by", pa.int64()),
+            ("handled_at", pa.string()),
+            ("member_message_id", pa.int64()),
+            ("photo_url", pa.string()),
+            ("notes", pa.string()),
+        ]
+    )
+
+    def to_table(batch):
+        columns = {}
+        for field in schema:
+            values = []
+            for r in batch:
+                v = r.get(field.name)
+                if v is not None and field.type == pa.string():
+                    v = str(v)
+                values.append(v)
+            columns[field.name] = values
+        return pa.Table.from_pydict(columns, schema=schema)
+
+    count = 0
+    batch = []
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH_SIZE:
+                writer.write_table(to_table(batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(to_table(batch))
+            count += len(batch)
+    return count
+
+
+def export_to_tempfile(rows, fmt: str = "csv"):
+    """
+    Stream rows into a temporary export file. Returns (path, row_count).
+    The caller is responsible for removing the file once it has been uploaded.
+    """
+    suffix = ".parquet" if fmt == "parquet" else ".csv.gz"
+    fd, path = tempfile.mkstemp(prefix="flips-", suffix=suffix)
+    os.close(fd)
+    try:
+        if fmt == "parquet":
+            count = write_parquet(rows, path)
+        else:
+            count = write_csv_gz(rows, path)
+    except Exception:
+        os.remove(path)
+        raise
+    logger.debug("Exported %s rows to %s", count, path)
+    return path, count
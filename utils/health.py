@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+from aiohttp import web
+from logger import get_logger
+from db.resilience import breaker
+from utils.cache import GuildCache
+from utils.pending import pending_approvals
+from utils.drain import drainer
+
+logger = get_logger("health")
+
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = os.getenv("HEALTH_PORT")  # unset = endpoint disabled
+LOOP_LAG_INTERVAL = float(os.getenv("HEALTH_LOOP_LAG_INTERVAL", "0.5"))
+DB_PROBE_INTERVAL = float(os.getenv("HEALTH_DB_PROBE_INTERVAL", "30"))
+# readiness fails once the loop falls this far behind (seconds)
+MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", "1.0"))
+# Prometheus text exposition format; aiohttp appends the charset
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# name -> callable returning the current depth; may be sync (runs in a thread)
+_queues = {}
+
+
+def register_queue(name: str, depth_fn):
+    """Expose a queue's depth on /status and /metrics."""
+    _queues[name] = depth_fn
+
+
+class HealthServer:
+    def __init__(self, bot, host: str = HEALTH_HOST, port: int = None):
+        self.bot = bot
+        self.host = host
+        self.port = int(port or HEALTH_PORT)
+        self.loop_lag = 0.0
+        self.max_loop_lag = 0.0
+        self.db_rtt = None
+        self.db_ok = None
+        self.db_checked_at = None
+        self._runner = None
+        self._tasks = []
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/readyz", self.readyz)
+        app.router.add_get("/status", self.status)
+        app.router.add_get("/metrics", self.metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._tasks = [
+            asyncio.create_task(self._measure_loop_lag(), name="health-loop-lag"),
+            asyncio.create_task(self._probe_db(), name="health-db-probe"),
+        ]
+        logger.info("Health endpoint listening on http://%s:%s", self.host, self.port)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _measure_loop_lag(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(0.0, time.perf_counter() - start - LOOP_LAG_INTERVAL)
+            self.loop_lag = lag
+            self.max_loop_lag = max(self.max_loop_lag, lag)
+
+    async def _probe_db(self):
+        from db.supabase import ping
+
+        while True:
+            start = time.perf_counter()
+            try:
+                ok, _ = await asyncio.to_thread(ping)
+            except Exception:
+                ok = False
+            self.db_rtt = time.perf_counter() - start
+            self.db_ok = ok
+            self.db_checked_at = time.time()
+            await asyncio.sleep(DB_PROBE_INTERVAL)
+
+    async def _queue_depths(self) -> dict:
+        depths = {}
+        for name, fn in _queues.items():
+            try:
+                depths[name] = await asyncio.to_thread(fn)
+            except Exception as e:
+                logger.debug("Could not read depth of queue %s: %s", name, e)
+                depths[name] = None
+        return depths
+
+    def _is_ready(self) -> bool:
+        return (
+            self.bot.is_ready()
+            and not self.bot.is_closed()
+            and not drainer.draining
+            and breaker.snapshot()["state"] != "open"
+            and self.loop_lag < MAX_LOOP_LAG
+        )
+
+    async def snapshot(self) -> dict:
+        latency = self.bot.latency
+        return {
+            "ready": self._is_ready(),
+            "gateway_latency": None if latency != latency else round(latency, 4),
+            "loop_lag": round(self.loop_lag, 4),
+            "max_loop_lag": round(self.max_loop_lag, 4),
+            "db": {
+                "ok": self.db_ok,
+                "rtt": None if self.db_rtt is None else round(self.db_rtt, 4),
+                "checked_at": self.db_checked_at,
+                "circuit": breaker.snapshot(),
+            },
+            "draining": drainer.draining,
+            "in_flight": drainer.in_flight(),
+            "guilds": len(self.bot.guilds),
+            "watchdog": (
+                self.bot.watchdog.stats() if getattr(self.bot, "watchdog", None) else None
+            ),
+            "queues": await self._queue_depths(),
+            "caches": {c.name: c.stats() for c in GuildCache.instances},
+            "pending_approvals": pending_approvals.stats(),
+        }
+
+    async def healthz(self, request):
+        # answering at all means the loop is alive
+        return web.json_response({"ok": True})
+
+    async def readyz(self, request):
+        ready = self._is_ready()
+        return web.json_response({"ready": ready}, status=200 if ready else 503)
+
+    async def status(self, request):
+        data = await self.snapshot()
+        return web.json_response(data, status=200 if data["ready"] else 503)
+
+    async def metrics(self, request):
+        data = await self.snapshot()
+        lines = [
+            "# TYPE flipbot_ready gauge",
+            f"flipbot_ready {int(data['ready'])}",
+            "# TYPE flipbot_gateway_latency_seconds gauge",
+            f"flipbot_gateway_latency_seconds {data['gateway_latency'] or 0}",
+            "# TYPE flipbot_event_loop_lag_seconds gauge",
+            f"flipbot_event_loop_lag_seconds {data['loop_lag']}",
+            "# TYPE flipbot_event_loop_lag_max_seconds gauge",
+            f"flipbot_event_loop_lag_max_seconds {data['max_loop_lag']}",
+            "# TYPE flipbot_db_up gauge",
+            f"flipbot_db_up {int(bool(data['db']['ok']))}",
+            "# TYPE flipbot_db_rtt_seconds gauge",
+            f"flipbot_db_rtt_seconds {data['db']['rtt'] or 0}",
+            "# TYPE flipbot_db_circuit_open gauge",
+            f"flipbot_db_circuit_open {int(data['db']['circuit']['state'] == 'open')}",
+            "# TYPE flipbot_guilds gauge",
+            f"flipbot_guilds {data['guilds']}",
+            "# TYPE flipbot_queue_depth gauge",
+        ]
+        for name, depth in data["queues"].items():
+            if depth is not None:
+                lines.append(f'flipbot_queue_depth{{queue="{name}"}} {depth}')
+        return web.Response(
+            text="\n".join(lines) + "\n",
+            content_type=METRICS_CONTENT_TYPE,
+            charset="utf-8",
+        )
@@ -1,18 +1,23 @@
+import asyncio
 import discord
 from discord import Embed
 from logger import get_logger
 from db.supabase import (
     ensure_guild_settings,
 )
+from db.resilience import DB_UNAVAILABLE_MESSAGE
 
 logger = get_logger("flip")
 
 
-def build_flip_embed(flip_row: dict, author_name: str):
+def build_flip_embed(flip_row: dict, author_name: str, flags=None, thumbnail_url=None):
     embed = Embed(
         title=str(flip_row.get("item", "Flip")),
         description=f"Submitted by {author_name}",
     )
+    if flags:
+        # duplicate/outlier warnings for the moderators reviewing it
+        embed.colour = discord.Colour.orange()
     embed.add_field(
         name="Purchase price",
         value=str(flip_row.get("purchase_price", "")),
@@ -30,57 +35,122 @@ def build_flip_embed(flip_row: dict, author_name: str):
     embed.add_field(name="Profit", value=str(flip_row.get("profit", "")), inline=True)
     if flip_row.get("notes"):
         embed.add_field(name="Notes", value=flip_row.get("notes"), inline=False)
+    if flags:
+        embed.add_field(
+            name="⚠️ Check before approving",
+            value="\n".join(f"• {flag}" for flag in flags)[:FIELD_LIMIT],
+            inline=False,
+        )
     if flip_row.get("photo_url"):
-        embed.set_image(url=flip_row.get("photo_url"))
+        if thumbnail_url:
+            # the downscaled copy loads fast in the review channel; link the original
+            embed.add_field(
+                name="Photo", value=f"[Full size]({flip_row['photo_url']})", inline=False
+            )
+        embed.set_image(url=thumbnail_url or flip_row.get("photo_url"))
     return embed
 
 
-def build_leaderboard_embed(rows):
-    """Builds an embed showing top users on the leaderboard."""
-    import discord
-
-    embed = discord.Embed(
-        title="🏆 Leaderboard",
-        description="Top members by total profit",
-    )
+LEADERBOARD_PAGE_ROWS = 30
+MEDALS = ["🥇", "🥈", "🥉"]
+# Discord limits: 1024 chars per field value, 25 fields and 6000 chars per embed
+FIELD_LIMIT = 1024
+EMBED_BUDGET = 5500
 
-    if not rows:
-        embed.add_field(name="No data", value="No approved flips yet.", inline=False)
-        return embed
 
-    medal_emojis = ["🥇", "🥈", "🥉"]
-
-    lines = []
-    for i, row in enumerate(rows, start=1):
-        user_id = row.get("id")
-        user_mention = f"<@{user_id}>" if user_id else "Unknown User"
+def _leaderboard_line(rank: int, row: dict) -> str:
+    user_id = row.get("id")
+    user_mention = f"<@{user_id}>" if user_id else "Unknown User"
+    try:
+        total_profit = float(row.get("total_profit") or 0)
+    except Exception:
+        total_profit = 0.0
+    rank_display = MEDALS[rank - 1] if rank <= 3 else f"#{rank}"
+    return f"{rank_display} {user_mention} — ${total_profit:,.2f}"
+
+
+def _chunk_lines(lines, limit=FIELD_LIMIT):
+    """Group lines into field values no longer than `limit` characters."""
+    chunk, size = [], 0
+    for line in lines:
+        if chunk and size + len(line) + 1 > limit:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        yield "\n".join(chunk)
+
+
+def build_leaderboard_pages(
+    rows,
+    title="🏆 Leaderboard",
+    description="Top members by total profit",
+    total=None,
+    page_rows=LEADERBOARD_PAGE_ROWS,
+):
+    """
+    Render the leaderboard as a list of embeds (one per page). Every row is
+    shown: long pages are split over several fields rather than truncated.
+    If `total` is given, each page starts with a "Total profit" field.
+    """
+    lines = [_leaderboard_line(i, row) for i, row in enumerate(rows or [], start=1)]
+    groups = [lines[i : i + page_rows] for i in range(0, len(lines), page_rows)] or [[]]
+
+    pages = []
+    for group in groups:
+        embed = Embed(title=title, description=description)
+        if total is not None:
+            embed.add_field(name="Total profit", value=f"${total:,.2f}", inline=False)
+        if not group:
+            embed.add_field(name="No data", value="No approved flips yet.", inline=False)
+        for n, value in enumerate(_chunk_lines(group)):
+            if len(embed) + len(value) > EMBED_BUDGET or len(embed.fields) >= 25:
+                break  # only reachable with an unusually large page_rows
+            embed.add_field(
+                name="Participants" if n == 0 else "\u200b", value=value, inline=False
+            )
+        pages.append(embed)
+
+    if len(pages) > 1:
+        for i, embed in enumerate(pages, start=1):
+            embed.set_footer(text=f"Page {i}/{len(pages)}")
+    return pages
 
-        try:
-            total_profit = float(row.get("total_profit") or 0)
-        except Exception:
-            total_profit = 0.0
 
-        profit_str = f"${total_profit:,.2f}"
+def build_leaderboard_embed(rows):
+    """Builds an embed showing top users on the leaderboard (first page)."""
+    return build_leaderboard_pages(rows)[0]
 
-        if i <= 3:
-            rank_display = medal_emojis[i - 1]
-        else:
-            rank_display = f"#{i}"
 
-        lines.append(f"{rank_display} {user_mention} — {profit_str}")
+def build_user_stats_embed(member_name: str, stats: dict, rank=None):
+    """Embed for /myflips: rank, total, approved count and recent approved flips."""
+    embed = Embed(title=f"📈 Flips — {member_name}")
+    embed.add_field(name="Rank", value=f"#{rank}" if rank else "Unranked", inline=True)
+    embed.add_field(name="Total profit", value=f"${stats['total']:,.2f}", inline=True)
+    embed.add_field(name="Approved flips", value=str(stats["count"]), inline=True)
 
-    leaderboard_text = "\n".join(lines)
+    lines = []
+    for flip in stats["recent"]:
+        try:
+            profit = float(flip.get("profit") or 0)
+        except Exception:
+            profit = 0.0
+        when = str(flip.get("handled_at") or "")[:10]
+        line = f"• **{flip.get('item') or 'Flip'}** — ${profit:,.2f}"
+        lines.append(f"{line} ({when})" if when else line)
     embed.add_field(
-        name="Leaderboard", value=leaderboard_text or "No data", inline=False
+        name="Recent flips",
+        value="\n".join(lines)[:FIELD_LIMIT] if lines else "No approved flips yet.",
+        inline=False,
     )
-
     return embed
 
 
 async def send_log_message(guild: discord.Guild, message: str):
     """Send a message to the configured log channel if available."""
     try:
-        settings = ensure_guild_settings(guild.id)
+        settings = await asyncio.to_thread(ensure_guild_settings, guild.id)
         log_chan_id = settings.get("log_channel_id")
         if not log_chan_id:
             return  # no log channel set
@@ -92,9 +162,14 @@ async def send_log_message(guild: discord.Guild, message: str):
         logger.warning(f"Failed to send log message: {e}")
 
 
-def clean_number(value: str) -> float:
-    """Remove $ and commas safely before converting to float."""
+async def reply_db_unavailable(interaction: discord.Interaction):
+    """Tell the user (ephemerally) that the database is down, whatever state the response is in."""
     try:
-        return float(value.replace("$", "").replace(",", "").strip() or 0.0)
-    except Exception:
-        return 0.0
+        if interaction.response.is_done():
+            await interaction.followup.send(DB_UNAVAILABLE_MESSAGE, ephemeral=True)
+        else:
+            await interaction.response.send_message(
+                DB_UNAVAILABLE_MESSAGE, ephemeral=True
+            )
+    except Exception as e:
+        logger.warning(f"Failed to send database-unavailable notice: {e}")
@@ -0,0 +1,158 @@
+import asyncio
+import heapq
+import os
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from logger import get_logger
+from utils.cache import GuildCache
+
+logger = get_logger("item_index")
+
+MAX_CHOICES = 25  # Discord's autocomplete limit
+SCAN_LIMIT = 500  # matches considered per keystroke before ranking by popularity
+# rebuilt from the database this often, in case other instances approved flips
+item_index_cache = GuildCache(
+    "item_index", ttl=float(os.getenv("ITEM_INDEX_TTL_HOURS", "6")) * 3600
+)
+# after a failed build, autocomplete offers nothing for this long instead of retrying
+ITEM_INDEX_RETRY_SECONDS = float(os.getenv("ITEM_INDEX_RETRY_SECONDS", "60"))
+
+
+def normalize_item(name: str) -> str:
+    return " ".join((name or "").casefold().split())
+
+
+class ItemIndex:
+    """
+    Item names of one guild for autocomplete. A sorted array of (key, item)
+    pairs, where the keys are the normalized name and every word-start suffix
+    of it, so "9.9" finds "Mercury 9.9hp" as well as "9.9 Johnson". A prefix
+    lookup is a bisect plus a short scan; matches are ranked by how often the
+    item was approved.
+    """
+
+    def __init__(self, names=()):
+        self.counts = Counter()
+        self.spellings = {}
+        self._keys = []
+        pending = set()
+        for name in names:
+            norm = self._count(name)
+            if norm:
+                pending.add(norm)
+        # build in one sort instead of repeated inserts
+        self._keys = sorted(k for norm in pending for k in self._entries(norm))
+
+    def __len__(self):
+        return len(self.counts)
+
+    @staticmethod
+    def _entries(norm: str):
+        words = norm.split(" ")
+        return [(" ".join(words[i:]), norm) for i in range(len(words))]
+
+    def _count(self, name: str):
+        norm = normalize_item(name)
+        if not norm:
+            return None
+        self.counts[norm] += 1
+        self.spellings.setdefault(norm, Counter())[name.strip()] += 1
+        return norm
+
+    def add(self, name: str):
+        """Record one more approved flip of `name`."""
+        norm = normalize_item(name)
+        if norm and norm not in self.counts:
+            for entry in self._entries(norm):
+                insort(self._keys, entry)
+        self._count(name)
+
+    def display(self, norm: str) -> str:
+        """The most used spelling of an item."""
+        return self.spellings[norm].most_common(1)[0][0]
+
+    def search(self, text: str, limit: int = MAX_CHOICES):
+        prefix = normalize_item(text)
+        if not prefix:
+            norms = heapq.nlargest(limit, self.counts, key=self.counts.get)
+        else:
+            matches = set()
+            i = bisect_left(self._keys, (prefix, ""))
+            while i < len(self._keys) and len(matches) < SCAN_LIMIT:
+                key, norm = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                matches.add(norm)
+                i += 1
+            # whole-name prefix matches first, then by popularity
+            norms = sorted(
+                matches,
+                key=lambda n: (not n.startswith(prefix), -self.counts[n], n),
+            )[:limit]
+        return [self.display(n) for n in norms]
+
+
+_builds = {}
+# guild id -> monotonic time before which a failed build isn't retried
+_failed_until = {}
+
+
+def _load(guild_id: int) -> ItemIndex:
+    from db.supabase import iter_flips
+
+    index = ItemIndex(
+        row.get("item")
+        for row in iter_flips(guild_id, status="approved", columns="item", page_size=1000)
+    )
+    logger.info("Built item index for guild %s (%s items)", guild_id, len(index))
+    return index
+
+
+async def get_item_index(guild_id: int, wait: float = 0):
+    """
+    The guild's index, or None if it isn't built yet. A missing index is built
+    in the background; `wait` seconds are spent waiting for it.
+    """
+    index = item_index_cache.get(guild_id)
+    if index is not None:
+        return index
+    if time.monotonic() < _failed_until.get(guild_id, 0):
+        return None
+
+    task = _builds.get(guild_id)
+    if task is None:
+
+        async def build():
+            try:
+                index = await asyncio.to_thread(_load, guild_id)
+                item_index_cache.set(guild_id, index)
+                _failed_until.pop(guild_id, None)
+                return index
+            except Exception as e:
+                # logged once per retry window, not on every keystroke
+                _failed_until[guild_id] = time.monotonic() + ITEM_INDEX_RETRY_SECONDS
+                logger.warning(
+                    "Failed to build item index for guild %s, retrying in %ss: %s",
+                    guild_id,
+                    ITEM_INDEX_RETRY_SECONDS,
+                    e,
+                )
+                return None
+            finally:
+                _builds.pop(guild_id, None)
+
+        task = _builds[guild_id] = asyncio.create_task(build())
+    if wait <= 0:
+        return None
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), wait)
+    except asyncio.TimeoutError:
+        return None
+
+
+def record_item(guild_id: int, name: str):
+    """Add an approved item to the guild's index if it is loaded."""
+    index = item_index_cache.get(guild_id)
+    if index is not None:
+        index.add(name)
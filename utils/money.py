@@ -0,0 +1,81 @@
+"""
+Strict parsing of the amounts typed into the flip modal.
+
+`parse_money()` returns integer cents and raises MoneyError (whose message is
+shown to the member) instead of guessing. Accepted, besides plain numbers:
+
+* a currency sign before or after: `$250`, `250 €`
+* thousands separators `,` `.` `'` or a space: `1,234.56`, `1.234,56`, `1 234`
+* a decimal comma: `12,50`
+* k / m shorthand: `1.2k`, `3m`
+
+Without a suffix, a separator followed by exactly three digits is read as a
+thousands separator (`1,500` and `1.500` are both 1500) unless the number
+starts with `0` (`0,001` has too many decimals); otherwise it is the decimal
+point, and at most two decimals are allowed. With a suffix the separator is
+always the decimal point (`1.999k` is 1999, `1,5k` is 1500) and thousands
+separators are not accepted.
+"""
+
+import re
+
+MAX_MONEY_CENTS = 100_000_000_00  # 100 million; anything above is a typo
+
+# the common case ("250", "19.99") skips the general pattern below
+_PLAIN = re.compile(r"(\d{1,12})(?:\.(\d{1,2}))?")
+_NUMBER = re.compile(
+    r"(?P<whole>[1-9]\d{0,2}(?P<sep>[,.' ])\d{3}(?:(?P=sep)\d{3})*|\d+)"
+    r"(?:(?P<dec>[.,])(?P<frac>\d+))?"
+)
+_SHORTHAND = re.compile(r"(?P<whole>\d+)(?:[.,](?P<frac>\d+))? ?(?P<suffix>[km])")
+_NON_DIGITS = re.compile(r"\D")
+_CURRENCY = "$€£"
+_SPACES = str.maketrans({"\u00a0": " ", "\u202f": " "})  # (narrow) no-break space
+_MULTIPLIERS = {"k": 1_000, "m": 1_000_000}
+
+
+class MoneyError(ValueError):
+    pass
+
+
+def parse_money(value: str) -> int:
+    """Integer cents for `value`; empty input is 0."""
+    text = (value or "").strip()
+    match = _PLAIN.fullmatch(text)
+    if match:
+        whole, frac = match.groups()
+        return _checked(int(whole) * 100 + (int(frac.ljust(2, "0")) if frac else 0))
+
+    text = text.translate(_SPACES).strip(_CURRENCY + " ").lower()
+    if not text:
+        return 0
+    if text.startswith("-"):
+        raise MoneyError("can't be negative")
+    match = _SHORTHAND.fullmatch(text)
+    if match:
+        multiplier = _MULTIPLIERS[match["suffix"]]
+    else:
+        match = _NUMBER.fullmatch(text)
+        if not match or match["dec"] and match["dec"] == match["sep"]:
+            raise MoneyError("isn't a number (e.g. 250, 1,299.99, 12,50 or 1.2k)")
+        multiplier = 1
+
+    whole = int(_NON_DIGITS.sub("", match["whole"]))
+    frac = match["frac"] or ""
+    # cents = (whole + frac / 10^len(frac)) * multiplier * 100, kept in integers
+    scale = 10 ** len(frac)
+    scaled = (whole * scale + int(frac or 0)) * multiplier * 100
+    if scaled % scale:
+        raise MoneyError("has more than two decimal places")
+    return _checked(scaled // scale)
+
+
+def _checked(cents: int) -> int:
+    if cents > MAX_MONEY_CENTS:
+        raise MoneyError(f"is over the {MAX_MONEY_CENTS // 100:,} limit")
+    return cents
+
+
+def cents_to_amount(cents: int) -> float:
+    """The numeric value stored in the flips table (dollars, at most 2 decimals)."""
+    return cents / 100
@@ -0,0 +1,137 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# entries older than this are dropped; a click after that falls back to a DB lookup
+PENDING_TTL = float(os.getenv("PENDING_TTL_HOURS", "72")) * 3600
+PENDING_MAX = int(os.getenv("PENDING_MAX", "20000"))
+
+
+class PendingEntry:
+    """What the approve/reject buttons need to know about one submission."""
+
+    __slots__ = (
+        "message_id",
+        "flip_id",
+        "guild_id",
+        "user_id",
+        "item",
+        "profit",
+        "outbox_id",
+        "created_at",
+    )
+
+    def __init__(self, message_id: int, flip: dict):
+        self.message_id = message_id
+        self.flip_id = flip.get("id")
+        self.guild_id = flip.get("guild_id")
+        self.user_id = flip.get("user_id")
+        self.item = flip.get("item")
+        self.profit = float(flip.get("profit") or 0.0)
+        self.outbox_id = flip.get("outbox_id")
+        self.created_at = time.monotonic()
+
+    def to_flip(self) -> dict:
+        return {
+            "id": self.flip_id,
+            "guild_id": self.guild_id,
+            "user_id": self.user_id,
+            "item": self.item,
+            "profit": self.profit,
+            "outbox_id": self.outbox_id,
+            "member_message_id": self.message_id,
+        }
+
+
+class PendingRegistry:
+    """
+    Submissions awaiting review, keyed by their member-flips message id.
+    Insertion order is creation order, so expiry and capacity eviction both
+    pop from the front.
+    """
+
+    def __init__(self, ttl: float = PENDING_TTL, max_entries: int = PENDING_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.handled = 0
+        self.expired = 0
+        self.evicted = 0
+        self._entries = OrderedDict()
+        self._claimed = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, message_id: int, flip: dict) -> PendingEntry:
+        entry = PendingEntry(message_id, flip)
+        with self._lock:
+            self._entries[message_id] = entry
+            self._evict()
+        return entry
+
+    def get(self, message_id: int):
+        with self._lock:
+            entry = self._entries.get(message_id)
+            if entry and time.monotonic() - entry.created_at > self.ttl:
+                del self._entries[message_id]
+                self.expired += 1
+                return None
+            return entry
+
+    def claim(self, message_id: int):
+        """
+        Start handling a submission. Returns (claimed, entry): `claimed` is False
+        while another handler has it, and `entry` (None if evicted) is taken out
+        of the registry so a second click can't act on it too.
+        """
+        with self._lock:
+            if message_id in self._claimed:
+                return False, None
+            self._claimed.add(message_id)
+            entry = self._entries.pop(message_id, None)
+            if entry and time.monotonic() - entry.created_at > self.ttl:
+                self.expired += 1
+                entry = None
+            return True, entry
+
+    def release(self, message_id: int, entry=None, handled: bool = False):
+        """End a claim; a submission that wasn't handled gets its entry back."""
+        with self._lock:
+            self._claimed.discard(message_id)
+            if handled:
+                self.handled += 1
+            elif entry is not None:
+                self._entries[message_id] = entry
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.created_at < cutoff:
+                self.expired += 1
+            elif len(self._entries) > self.max_entries:
+                self.evicted += 1
+            else:
+                break
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict()
+            entries = list(self._entries.values())
+            size = sys.getsizeof(self._entries)
+        for e in entries:
+            size += sys.getsizeof(e) + sys.getsizeof(e.item or "")
+        return {
+            "entries": len(entries),
+            "approx_bytes": size,
+            "handled": self.handled,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+pending_approvals = PendingRegistry()
@@ -0,0 +1,207 @@
+"""
+Photo attachments for flips.
+
+The attachment is streamed from Discord's CDN straight into object storage in
+chunks, so at most one chunk is held in memory. Chunks are also spooled to a
+temporary file, from which a small JPEG thumbnail is made in a worker thread
+(Pillow, optional). Storage is Supabase Storage (bucket PHOTO_BUCKET) or, with
+PHOTO_STORAGE=local, a directory served from PHOTO_PUBLIC_URL.
+"""
+
+import asyncio
+import importlib.util
+import io
+import os
+import tempfile
+import uuid
+import aiohttp
+from logger import get_logger
+
+logger = get_logger("photos")
+
+PHOTO_STORAGE = os.getenv("PHOTO_STORAGE", "supabase")  # supabase | local
+PHOTO_BUCKET = os.getenv("PHOTO_BUCKET", "flip-photos")
+PHOTO_MAX_BYTES = int(float(os.getenv("PHOTO_MAX_MB", "8")) * 1024 * 1024)
+PHOTO_DIR = os.getenv(
+    "PHOTO_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "photos"),
+)
+PHOTO_PUBLIC_URL = os.getenv("PHOTO_PUBLIC_URL", "http://localhost:8080/photos")
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+CHUNK_SIZE = 64 * 1024
+UPLOAD_TIMEOUT = aiohttp.ClientTimeout(total=120, sock_read=30)
+
+ALLOWED_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+
+
+class PhotoRejected(ValueError):
+    """The attachment can't be used as a flip photo (type or size)."""
+
+
+def validate_attachment(attachment):
+    """Cheap checks on what Discord reports, before anything is downloaded."""
+    content_type = (attachment.content_type or "").split(";")[0].strip()
+    if content_type not in ALLOWED_TYPES:
+        raise PhotoRejected("The photo must be a JPEG, PNG, WebP or GIF image.")
+    if attachment.size > PHOTO_MAX_BYTES:
+        raise PhotoRejected(
+            f"The photo is {attachment.size / (1024 * 1024):.1f} MB; "
+            f"the limit is {PHOTO_MAX_BYTES / (1024 * 1024):.0f} MB."
+        )
+    return content_type
+
+
+class SupabasePhotoStore:
+    def __init__(self, url: str, key: str, bucket: str = PHOTO_BUCKET):
+        self.base = url.rstrip("/") + "/storage/v1"
+        self.key = key
+        self.bucket = bucket
+
+    async def put(self, session, path: str, data, content_type: str):
+        """Upload `data` (bytes or an async iterator of chunks, sent chunked)."""
+        async with session.post(
+            f"{self.base}/object/{self.bucket}/{path}",
+            data=data,
+            headers={
+                "Authorization": f"Bearer {self.key}",
+                "apikey": self.key,
+                "Content-Type": content_type,
+                "x-upsert": "true",
+            },
+        ) as resp:
+            if resp.status >= 300:
+                raise RuntimeError(
+                    f"Storage upload failed ({resp.status}): {(await resp.text())[:200]}"
+                )
+        return f"{self.base}/object/public/{self.bucket}/{path}"
+
+
+class LocalPhotoStore:
+    """Stand-in for development: files on disk, served by whatever hosts PHOTO_PUBLIC_URL."""
+
+    def __init__(self, directory: str = PHOTO_DIR, public_url: str = PHOTO_PUBLIC_URL):
+        self.directory = directory
+        self.public_url = public_url.rstrip("/")
+
+    async def put(self, session, path: str, data, content_type: str):
+        # file I/O runs in worker threads so a slow disk doesn't stall the loop
+        target = os.path.join(self.directory, *path.split("/"))
+        partial = target + ".part"
+        fh = await asyncio.to_thread(self._open, partial)
+        try:
+            if isinstance(data, (bytes, bytearray)):
+                await asyncio.to_thread(fh.write, data)
+            else:
+                async for chunk in data:
+                    await asyncio.to_thread(fh.write, chunk)
+            await asyncio.to_thread(fh.close)
+            await asyncio.to_thread(os.replace, partial, target)
+        finally:
+            fh.close()
+            await asyncio.to_thread(self._discard, partial)
+        return f"{self.public_url}/{path}"
+
+    @staticmethod
+    def _open(partial: str):
+        os.makedirs(os.path.dirname(partial), exist_ok=True)
+        return open(partial, "wb")
+
+    @staticmethod
+    def _discard(partial: str):
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+_session = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """One session (and connection pool) for every download and upload."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=UPLOAD_TIMEOUT)
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def get_store():
+    if PHOTO_STORAGE == "local":
+        return LocalPhotoStore()
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise RuntimeError("Supabase credentials not set (SUPABASE_URL / SUPABASE_KEY).")
+    return SupabasePhotoStore(url, key)
+
+
+async def _stream(resp, spool, limit: int):
+    """Yield the download in chunks, copying them to `spool` and enforcing `limit`."""
+    size = 0
+    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+        size += len(chunk)
+        if size > limit:
+            # Discord's reported size was wrong; stop before storing more
+            raise PhotoRejected("The photo is larger than the upload limit.")
+        await asyncio.to_thread(spool.write, chunk)
+        yield chunk
+
+
+def thumbnails_available() -> bool:
+    """Whether Pillow is installed; checked without importing it."""
+    return importlib.util.find_spec("PIL") is not None
+
+
+def make_thumbnail(path: str, size: int = THUMBNAIL_SIZE):
+    """JPEG bytes of a downscaled copy, or None when Pillow isn't installed."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(path) as image:
+        # draft() lets JPEG decoding skip most of the full-resolution work
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size))
+        out = io.BytesIO()
+        image.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+        return out.getvalue()
+
+
+async def store_photo(attachment, guild_id: int):
+    """
+    Stream `attachment` into storage and add a thumbnail next to it.
+    Returns (photo_url, thumbnail_url); thumbnail_url is None without Pillow.
+    """
+    content_type = validate_attachment(attachment)
+    store = get_store()
+    ext = os.path.splitext(attachment.filename)[1].lower() or ".img"
+    name = f"{guild_id}/{uuid.uuid4().hex}"
+
+    session = _get_session()
+    with tempfile.NamedTemporaryFile(suffix=ext) as spool:
+        async with session.get(attachment.url) as resp:
+            resp.raise_for_status()
+            photo_url = await store.put(
+                session,
+                name + ext,
+                _stream(resp, spool, PHOTO_MAX_BYTES),
+                content_type,
+            )
+        spool.flush()
+
+        thumbnail_url = None
+        try:
+            thumbnail = await asyncio.to_thread(make_thumbnail, spool.name)
+            if thumbnail:
+                thumbnail_url = await store.put(
+                    session, name + ".thumb.jpg", thumbnail, "image/jpeg"
+                )
+        except Exception as e:
+            logger.warning("Could not make a thumbnail for %s: %s", photo_url, e)
+
+    logger.info("Stored photo %s (%s bytes)", photo_url, attachment.size)
+    return photo_url, thumbnail_url
@@ -0,0 +1,177 @@
+"""
+On-demand profiling of the running bot.
+
+`profile_session(seconds)` samples every thread's stack at a fixed interval
+(cheap enough for live traffic) and, optionally, runs cProfile on the event-loop
+thread for the same window. It returns a text report of the top functions by
+cumulative time and a collapsed-stack file for flamegraph tools
+(flamegraph.pl, speedscope, inferno).
+"""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "120"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+TOP_FUNCTIONS = 40
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_session_lock = asyncio.Lock()
+
+
+def _label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(ROOT):
+        filename = os.path.relpath(filename, ROOT)
+    else:
+        # site-packages paths are long; package/module is enough to recognise them
+        filename = os.sep.join(filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code))
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+class StackSampler:
+    """
+    Statistical profiler counting collapsed stacks.
+
+    The main (event-loop) thread is sampled from a SIGALRM interval timer: the
+    handler runs in that thread and sees exactly what it was executing. Sampling
+    it from another thread instead would be skewed by the GIL, which such a
+    thread mostly gets while the loop sits in select(). Worker threads (e.g.
+    asyncio.to_thread calls) are sampled from a daemon thread.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.stacks = Counter()
+        self._thread_stacks = Counter()
+        self._use_signal = False
+        self._previous_handler = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._use_signal = (
+            hasattr(signal, "setitimer")
+            and threading.current_thread() is threading.main_thread()
+        )
+        if self._use_signal:
+            self._previous_handler = signal.signal(signal.SIGALRM, self._on_signal)
+            signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        self._thread = threading.Thread(
+            target=self._run, name="profile-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._use_signal:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous_handler or signal.SIG_DFL)
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.stacks.update(self._thread_stacks)
+
+    def _on_signal(self, signum, frame):
+        self.stacks[_collapse(frame, threading.main_thread().name)] += 1
+        self.samples += 1
+
+    def _run(self):
+        skip = {threading.get_ident()}
+        if self._use_signal:
+            skip.add(threading.main_thread().ident)
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in skip:
+                    continue
+                self._thread_stacks[
+                    _collapse(frame, names.get(ident, f"thread-{ident}"))
+                ] += 1
+            if not self._use_signal:
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = TOP_FUNCTIONS) -> str:
+        """Functions by share of samples they were on the stack (cum) or on top (self)."""
+        cumulative, own = Counter(), Counter()
+        per_thread = Counter()
+        for stack, count in self.stacks.items():
+            thread, *frames = stack.split(";")
+            per_thread[thread] += count
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        total = sum(per_thread.values()) or 1
+        lines = [
+            "Samples per thread: "
+            + ", ".join(f"{name} {count}" for name, count in per_thread.most_common()),
+            "",
+            f"{'cum %':>7} {'self %':>7}  function",
+        ]
+        for frame, count in cumulative.most_common(limit):
+            lines.append(
+                f"{100 * count / total:>6.1f}% {100 * own[frame] / total:>6.1f}%  {frame}"
+            )
+        return "\n".join(lines)
+
+
+async def profile_session(seconds: float, use_cprofile: bool = False):
+    """
+    Profile for `seconds` and return (report_text, collapsed_stacks). Only one
+    session runs at a time; raises RuntimeError if another is in progress.
+    """
+    if _session_lock.locked():
+        raise RuntimeError("A profiling session is already running.")
+    seconds = max(1.0, min(float(seconds), PROFILE_MAX_SECONDS))
+
+    async with _session_lock:
+        sampler = StackSampler()
+        profiler = cProfile.Profile() if use_cprofile else None
+        started = time.monotonic()
+        sampler.start()
+        if profiler:
+            # cProfile hooks the calling thread only: this is the event-loop thread
+            profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            if profiler:
+                profiler.disable()
+            sampler.stop()  # restores the signal handler, so it must run on this thread
+        elapsed = time.monotonic() - started
+
+    report = io.StringIO()
+    report.write(
+        f"Sampled every {sampler.interval * 1000:.0f}ms for {elapsed:.1f}s "
+        f"({sampler.samples} samples of the event-loop thread).\n"
+    )
+    report.write(sampler.top())
+    if profiler:
+        report.write("\n\n--- cProfile (event-loop thread) ---\n")
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(
+            TOP_FUNCTIONS
+        )
+    return report.getvalue(), sampler.collapsed()
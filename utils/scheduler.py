@@ -0,0 +1,112 @@
+import asyncio
+import os
+import random
+import time
+from logger import get_logger
+from db.resilience import DatabaseUnavailable
+
+logger = get_logger("scheduler")
+
+MAINTENANCE_CONCURRENCY = int(os.getenv("MAINTENANCE_CONCURRENCY", "4"))
+# each run is rescheduled interval * (1 ± jitter) after it starts
+MAINTENANCE_JITTER = float(os.getenv("MAINTENANCE_JITTER", "0.1"))
+
+
+class Job:
+    __slots__ = ("name", "interval", "fn", "per_guild")
+
+    def __init__(self, name: str, interval: float, fn, per_guild: bool = True):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.per_guild = per_guild
+
+
+class GuildScheduler:
+    """
+    Runs periodic maintenance for every guild without synchronized bursts.
+
+    Each (job, guild) pair gets its own due time: the first run lands at a
+    random point within one interval, later runs one interval (± jitter) after
+    the previous start. `tick()` is meant to be driven by a short `tasks.loop`;
+    it starts whatever is due and never runs more than `concurrency` jobs at
+    once, or two runs of the same job for the same guild.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = MAINTENANCE_CONCURRENCY,
+        jitter: float = MAINTENANCE_JITTER,
+        seed=None,
+    ):
+        self.jobs = []
+        self.jitter = jitter
+        self.runs = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._due = {}
+        self._running = set()
+        self._tasks = set()
+
+    def add_job(self, name: str, interval: float, fn, per_guild: bool = True):
+        """`fn(guild)` (or `fn()` when per_guild is False) is an async callable."""
+        self.jobs.append(Job(name, interval, fn, per_guild))
+
+    def _next_run(self, job: Job, now: float) -> float:
+        spread = job.interval * self.jitter
+        return now + job.interval + self._rng.uniform(-spread, spread)
+
+    def tick(self, guilds):
+        now = time.monotonic()
+        for job in self.jobs:
+            for guild in guilds if job.per_guild else (None,):
+                key = (job.name, guild.id if guild else None)
+                due = self._due.get(key)
+                if due is None:
+                    self._due[key] = now + self._rng.uniform(0, job.interval)
+                    continue
+                if due > now or key in self._running:
+                    continue
+                self._due[key] = self._next_run(job, now)
+                self._running.add(key)
+                task = asyncio.create_task(
+                    self._run(job, guild, key), name=f"maintenance-{key[0]}-{key[1]}"
+                )
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+        # forget guilds we have left
+        if len(self._due) > len(self.jobs) * (len(guilds) + 1):
+            live = {g.id for g in guilds} | {None}
+            for key in [k for k in self._due if k[1] not in live]:
+                del self._due[key]
+
+    async def _run(self, job: Job, guild, key):
+        try:
+            async with self._semaphore:
+                if guild is None:
+                    await job.fn()
+                else:
+                    await job.fn(guild)
+            self.runs += 1
+        except DatabaseUnavailable as e:
+            self.failures += 1
+            logger.warning("Skipped %s for %s, database unavailable: %s", *key, e)
+        except Exception:
+            self.failures += 1
+            logger.exception("Maintenance job %s failed for %s", *key)
+        finally:
+            self._running.discard(key)
+
+    def running(self) -> int:
+        return len(self._running)
+
+    async def wait(self, timeout: float = None):
+        """Until the jobs running now have finished (or `timeout` passes)."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    def cancel(self):
+        for task in list(self._tasks):
+            task.cancel()
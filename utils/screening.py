@@ -0,0 +1,95 @@
+import os
+import statistics
+import time
+from collections import OrderedDict, deque
+from utils.item_index import normalize_item
+
+# a resubmission inside this window is flagged
+DUPLICATE_WINDOW = float(os.getenv("DUPLICATE_WINDOW_HOURS", "72")) * 3600
+RECENT_PER_GUILD = 5000
+# profit outliers: more than OUTLIER_MADS robust deviations from the guild's median
+PROFIT_SAMPLE_SIZE = 500
+MIN_PROFIT_SAMPLES = 20
+OUTLIER_MADS = float(os.getenv("OUTLIER_MADS", "6"))
+
+
+class GuildScreen:
+    """Recent submissions of one guild, kept in memory for cheap duplicate/outlier checks."""
+
+    def __init__(self):
+        # fingerprint -> (monotonic time, jump url); oldest first
+        self.exact = OrderedDict()
+        self.by_item = OrderedDict()
+        self.profits = deque(maxlen=PROFIT_SAMPLE_SIZE)
+
+    @staticmethod
+    def _keys(flip: dict):
+        item_key = (int(flip["user_id"]), normalize_item(flip.get("item")))
+        prices = tuple(
+            round(float(flip.get(k) or 0.0), 2)
+            for k in ("purchase_price", "parts_price", "sales_price")
+        )
+        return hash(item_key + prices), hash(item_key)
+
+    def _expire(self, now: float):
+        for index in (self.exact, self.by_item):
+            while index and (
+                next(iter(index.values()))[0] < now - DUPLICATE_WINDOW
+                or len(index) > RECENT_PER_GUILD
+            ):
+                index.popitem(last=False)
+
+    def check(self, flip: dict):
+        """Human-readable flags for a submission (empty when nothing looks off)."""
+        now = time.monotonic()
+        self._expire(now)
+        flags = []
+        exact_key, item_key = self._keys(flip)
+        if exact_key in self.exact:
+            seen, url = self.exact[exact_key]
+            flags.append(f"Possible duplicate of {url} ({_ago(now - seen)} ago)")
+        elif item_key in self.by_item:
+            seen, url = self.by_item[item_key]
+            flags.append(f"Same item submitted by this member {_ago(now - seen)} ago: {url}")
+
+        # negative prices never get here: FlipModal.parse_prices rejects them
+        if not float(flip.get("sales_price") or 0.0):
+            flags.append("No sale price")
+
+        profit = float(flip.get("profit") or 0.0)
+        if len(self.profits) >= MIN_PROFIT_SAMPLES:
+            median = statistics.median(self.profits)
+            # 1.4826 * MAD estimates the standard deviation for normal data
+            spread = 1.4826 * statistics.median(abs(p - median) for p in self.profits)
+            spread = max(spread, 1.0)
+            if abs(profit - median) > OUTLIER_MADS * spread:
+                flags.append(
+                    f"Unusual profit: ${profit:,.2f} (typical here: ${median:,.2f} ± ${spread:,.2f})"
+                )
+        return flags
+
+    def record(self, flip: dict, url: str):
+        now = time.monotonic()
+        exact_key, item_key = self._keys(flip)
+        for index, key in ((self.exact, exact_key), (self.by_item, item_key)):
+            index.pop(key, None)
+            index[key] = (now, url)
+        self.profits.append(float(flip.get("profit") or 0.0))
+
+
+def _ago(seconds: float) -> str:
+    if seconds < 3600:
+        return f"{max(1, int(seconds // 60))}m"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h"
+    return f"{int(seconds // 86400)}d"
+
+
+_screens = {}
+
+
+def screen_for(guild_id: int) -> GuildScreen:
+    screen = _screens.get(guild_id)
+    if screen is None:
+        screen = _screens[guild_id] = GuildScreen()
+    return screen
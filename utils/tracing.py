@@ -0,0 +1,197 @@
+"""
+Lightweight trace spans written as JSON lines.
+
+A trace starts at an interaction handler (trace id = interaction id) via the
+`traced()` decorator; `span()` opens child spans. The current span lives in a
+contextvar, so spans opened inside `asyncio.to_thread` calls (every database
+call goes through `db.resilience.run` in one) attach to the right parent.
+`instrument_discord(bot)` adds a span for every Discord REST call.
+
+Set TRACE_FILE (e.g. data/traces.jsonl) to enable; when unset, spans are no-ops.
+Each line is one finished span:
+
+    {"trace_id": "...", "span_id": "...", "parent_id": "...", "name": "db get_flip_by_message_id",
+     "start": 1700000000.123, "duration_ms": 41.2, "status": "ok", "attrs": {...}}
+"""
+
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from logger import get_logger
+
+logger = get_logger("tracing")
+
+TRACE_FILE = os.getenv("TRACE_FILE")  # unset = tracing disabled
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start", "_t0")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attrs=None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record(self, error=None) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "status": "error" if error else "ok",
+            "error": repr(error) if error else None,
+            "thread": threading.current_thread().name,
+            "attrs": self.attrs,
+        }
+
+
+class JsonlExporter:
+    """Appends finished spans to a file from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.exported = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(
+            target=self._run, name="trace-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as fh:
+            while True:
+                record = self._queue.get()
+                batch = [record]
+                while len(batch) < 500:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    fh.write(
+                        "".join(json.dumps(r, default=str) + "\n" for r in batch)
+                    )
+                    fh.flush()
+                    self.exported += len(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    logger.warning("Failed to write %s span(s): %s", len(batch), e)
+
+
+exporter = JsonlExporter(TRACE_FILE) if TRACE_FILE else None
+
+
+def current_span():
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, trace_id: str = None, **attrs):
+    """
+    Time a block as a child of the current span. Without a current span it
+    starts a new trace (using `trace_id` if given); with tracing disabled it
+    does nothing and yields None.
+    """
+    if exporter is None:
+        yield None
+        return
+    parent = _current.get()
+    if parent is not None and trace_id is None:
+        s = Span(name, parent.trace_id, parent.span_id, attrs)
+    else:
+        s = Span(name, str(trace_id or f"{random.getrandbits(64):016x}"), attrs=attrs)
+    token = _current.set(s)
+    error = None
+    try:
+        yield s
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        exporter.export(s.record(error))
+
+
+def traced(name: str):
+    """
+    Decorator for interaction handlers: runs the handler inside a root span whose
+    trace id is the interaction id, so everything it does can be correlated.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if exporter is None:
+                return await fn(*args, **kwargs)
+            import discord
+
+            interaction = next(
+                (a for a in args if isinstance(a, discord.Interaction)),
+                kwargs.get("interaction"),
+            )
+            attrs = {}
+            if interaction is not None:
+                attrs = {"guild_id": interaction.guild_id, "user_id": interaction.user.id}
+            with span(name, trace_id=getattr(interaction, "id", None), **attrs):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_discord(bot):
+    """Wrap Discord REST calls (bot HTTP client and interaction webhooks) in spans."""
+    if exporter is None:
+        return
+    from discord.webhook.async_ import AsyncWebhookAdapter
+
+    http_request = bot.http.request
+
+    async def request(route, **kwargs):
+        with span(
+            f"discord {route.method} {route.path}",
+            channel_id=route.channel_id,
+        ):
+            return await http_request(route, **kwargs)
+
+    bot.http.request = request
+
+    webhook_request = AsyncWebhookAdapter.request
+    if getattr(webhook_request, "__traced__", False):
+        return
+
+    async def traced_webhook_request(self, route, *args, **kwargs):
+        with span(f"discord {route.method} {route.path}"):
+            return await webhook_request(self, route, *args, **kwargs)
+
+    traced_webhook_request.__traced__ = True
+    AsyncWebhookAdapter.request = traced_webhook_request
+    logger.info("Tracing Discord and database calls to %s", TRACE_FILE)
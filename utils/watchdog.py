@@ -0,0 +1,120 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from logger import get_logger
+
+logger = get_logger("watchdog")
+
+# a stall longer than this (seconds) gets its stack logged; 0 disables the watchdog
+WATCHDOG_THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD", "1.0"))
+WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", "0.1"))
+STACK_LIMIT = 30
+
+
+def describe_interaction(frame) -> str:
+    """Walk a stack looking for a discord.Interaction local and describe it."""
+    try:
+        import discord
+    except ImportError:
+        return None
+
+    while frame is not None:
+        try:
+            interaction = frame.f_locals.get("interaction")
+        except Exception:
+            interaction = None
+        if isinstance(interaction, discord.Interaction):
+            command = getattr(interaction, "command", None)
+            if command is not None:
+                label = f"/{command.qualified_name}"
+            else:
+                data = interaction.data or {}
+                label = f"{interaction.type.name}:{data.get('custom_id', '?')}"
+            guild_id = interaction.guild_id or "dm"
+            return f"{label} (interaction {interaction.id}, guild {guild_id})"
+        frame = frame.f_back
+    return None
+
+
+class LoopWatchdog:
+    """
+    Detects event-loop blocking. The loop bumps a heartbeat every WATCHDOG_INTERVAL;
+    a background thread notices when the heartbeat goes stale and samples the loop
+    thread's stack while it is still blocked, so the log shows the offending call.
+    """
+
+    def __init__(self, loop, threshold: float = WATCHDOG_THRESHOLD):
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = WATCHDOG_INTERVAL
+        self.stalls = 0
+        self.longest_stall = 0.0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._beat()
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+        logger.info("Event-loop watchdog started (threshold %.2fs)", self.threshold)
+
+    def stop(self):
+        self._stop.set()
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+        if not self._stop.is_set():
+            self.loop.call_later(self.interval, self._beat)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold:
+                if reported_beat is not None and beat != reported_beat:
+                    # the blocked callback finished; report how long it really took
+                    logger.warning(
+                        "Event loop unblocked after %.2fs", beat - reported_beat
+                    )
+                    self.longest_stall = max(self.longest_stall, beat - reported_beat)
+                    reported_beat = None
+                continue
+            if reported_beat == beat:
+                continue  # already reported this stall
+            reported_beat = beat
+            self.stalls += 1
+            self._report(stalled)
+
+    def _report(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        context = describe_interaction(frame) or "no interaction in stack"
+        # asyncio's own frames (run_forever, _run_once, Handle._run) are noise here
+        entries = [
+            entry
+            for entry in traceback.extract_stack(frame)
+            if os.sep + "asyncio" + os.sep not in entry.filename
+        ][-STACK_LIMIT:]
+        stack = "".join(traceback.format_list(entries))
+        logger.warning(
+            "Event loop blocked for %.2fs+ while handling %s. Blocking stack:\n%s",
+            stalled,
+            context,
+            stack,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "stalls": self.stalls,
+            "longest_stall": round(self.longest_stall, 3),
+            "threshold": self.threshold,
+        }